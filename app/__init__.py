@@ -1,12 +1,12 @@
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from flask_cors import CORS
 from config import Config
 
-db = SQLAlchemy()
-
 
 def create_app():
+    # Flask 及各插件在这里才导入：只用到物理/计费核心 (app.core.policies 等) 的工具不必加载它们
+    from flask import Flask
+    from flask_cors import CORS
+    from app.extensions import db
+
     app = Flask(__name__)
     app.config.from_object(Config)
 
@@ -19,8 +19,20 @@ def create_app():
     # 放在函数内部避免循环导入
     from app.controllers.ac_controller import ac_bp
     from app.controllers.front_controller import front_bp
+    from app.controllers.report_controller import report_bp
+    from app.controllers.admin_controller import admin_bp
 
     app.register_blueprint(ac_bp, url_prefix='/api/ac')
     app.register_blueprint(front_bp, url_prefix='/api/front')
+    app.register_blueprint(report_bp, url_prefix='/api/report')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+
+    return app
+
 
-    return app
\ No newline at end of file
+def __getattr__(name):
+    # `from app import db` 首次使用时才导入 Flask-SQLAlchemy
+    if name == 'db':
+        from app.extensions import db
+        return db
+    raise AttributeError(f"module 'app' has no attribute {name!r}")
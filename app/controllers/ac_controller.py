@@ -1,27 +1,56 @@
 from flask import Blueprint, request, jsonify
 from app.core.scheduler import Scheduler
-from app.models import Room
+from app.core import serialization
 
 ac_bp = Blueprint('ac_bp', __name__)
 
 
 @ac_bp.route('/roomState/<room_id>', methods=['GET'])
 def get_room_state(room_id):
-    room = Room.query.get(room_id)
-    if not room: return jsonify({'code': 404})
+    try:
+        fields = serialization.parse_fields(request.args.get('fields'), serialization.ROOM_FIELDS)
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': str(e)})
 
-    data = room.to_dict()
-    scheduler = Scheduler()
-    data['sched_status'] = scheduler.get_scheduling_status(room_id)
-    return jsonify(data)
+    data = Scheduler().get_room_payload(room_id, fields)
+    if data is None: return jsonify({'code': 404})
+    return serialization.json_response(data)
+
+
+@ac_bp.route('/roomStates', methods=['GET'])
+def get_room_states():
+    """
+    批量房间状态 (监控大屏轮询)。?fields=room_id,current_temp 投影，
+    ?format=columnar 返回列式数据，?room_ids=101,102 只取部分房间。
+    """
+    try:
+        fields = serialization.parse_fields(request.args.get('fields'), serialization.ROOM_FIELDS)
+        fmt = serialization.parse_format(request.args.get('format'))
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': str(e)})
+
+    room_ids = request.args.get('room_ids')
+    if room_ids: room_ids = [rid.strip() for rid in room_ids.split(',') if rid.strip()]
+    return serialization.json_response(Scheduler().get_rooms_payload(fields, fmt, room_ids or None))
+
+
+@ac_bp.route('/powerStatus', methods=['GET'])
+def get_power_status():
+    return jsonify({'code': 200, 'data': Scheduler().get_power_status()})
 
 
 @ac_bp.route('/setMode', methods=['POST'])
 def set_mode():
-    data = request.get_json()
+    data = request.get_json() or {}
     mode = data.get('mode', 'COOL')
-    Scheduler().reset_mode(mode)
-    return jsonify({'code': 200, 'msg': f'Reset to {mode} (Paused)'})
+    # 默认保留详单/账单历史；wipe=true 才回滚到该模式的基线快照 (演示/测试环境)
+    wipe = bool(data.get('wipe', False))
+    try:
+        if not Scheduler().reset_mode(mode, wipe):
+            return jsonify({'code': 500, 'msg': 'Reset failed'})
+    except ValueError as e:
+        return jsonify({'code': 409, 'msg': str(e)})
+    return jsonify({'code': 200, 'msg': f"Reset to {mode}{' (wiped)' if wipe else ''} (Paused)"})
 
 
 @ac_bp.route('/startSimulation', methods=['POST'])
@@ -43,12 +72,10 @@ def toggle_power(room_id):
     power_status = data.get('power_status')
 
     scheduler = Scheduler()
-    room = Room.query.get(room_id)
 
     if power_status == 'ON':
-        target = data.get('target_temp', room.target_temp)
-        fan = data.get('fan_speed', room.fan_speed)
-        scheduler.request_power(room_id, fan, target)
+        # 未传的参数沿用房间当前设置
+        scheduler.request_power(room_id, data.get('fan_speed'), data.get('target_temp'))
     else:
         scheduler.stop_power(room_id)
     return jsonify({'code': 200, 'msg': 'success'})
@@ -58,8 +85,7 @@ def toggle_power(room_id):
 def set_temp(room_id):
     data = request.get_json()
     target_temp = data.get('target_temp')
-    room = Room.query.get(room_id)
-    Scheduler().request_power(room_id, room.fan_speed, target_temp)
+    Scheduler().request_power(room_id, None, target_temp)
     return jsonify({'code': 200, 'msg': 'success'})
 
 
@@ -67,6 +93,27 @@ def set_temp(room_id):
 def set_fan_speed(room_id):
     data = request.get_json()
     fan_speed = data.get('fan_speed')
-    room = Room.query.get(room_id)
-    Scheduler().request_power(room_id, fan_speed, room.target_temp)
-    return jsonify({'code': 200, 'msg': 'success'})
\ No newline at end of file
+    Scheduler().request_power(room_id, fan_speed, None)
+    return jsonify({'code': 200, 'msg': 'success'})
+
+
+@ac_bp.route('/snapshots', methods=['GET'])
+def list_snapshots():
+    from app.core import snapshot
+    return jsonify({'code': 200, 'data': snapshot.list_snapshots()})
+
+
+@ac_bp.route('/snapshot', methods=['POST'])
+def capture_snapshot():
+    from app.core import snapshot
+    name = (request.get_json() or {}).get('name')
+    if not snapshot.valid_name(name): return jsonify({'code': 400, 'msg': 'Invalid name'})
+    Scheduler().capture_snapshot(name)
+    return jsonify({'code': 200, 'msg': f'Snapshot {name} saved'})
+
+
+@ac_bp.route('/restore', methods=['POST'])
+def restore_snapshot():
+    name = (request.get_json() or {}).get('name')
+    if not Scheduler().restore_snapshot(name): return jsonify({'code': 404, 'msg': 'No Snapshot'})
+    return jsonify({'code': 200, 'msg': f'Snapshot {name} restored (Paused)'})
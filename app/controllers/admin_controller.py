@@ -0,0 +1,50 @@
+from flask import Blueprint, request, jsonify, Response
+from app.core.profiler import SamplingProfiler, DEFAULT_THREADS
+from config import SystemConstants
+import hmac
+
+admin_bp = Blueprint('admin_bp', __name__)
+
+
+@admin_bp.before_request
+def require_admin():
+    token = SystemConstants.ADMIN_TOKEN
+    if not token:
+        return jsonify({'code': 403, 'msg': 'Admin API disabled'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token):
+        return jsonify({'code': 401, 'msg': 'Unauthorized'}), 401
+
+
+@admin_bp.route('/profile', methods=['POST'])
+def profile():
+    """
+    采样 N 秒后返回聚合调用栈。
+    ?seconds=10&format=collapsed|pstats&threads=physics,request&interval_ms=5&lines=1
+    """
+    fmt = request.args.get('format', 'collapsed')
+    if fmt not in ('collapsed', 'pstats'):
+        return jsonify({'code': 400, 'msg': 'format: collapsed | pstats'})
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval_ms = float(request.args.get('interval_ms', SystemConstants.PROFILER_INTERVAL_MS))
+    except ValueError:
+        return jsonify({'code': 400, 'msg': 'seconds / interval_ms must be numbers'})
+    if seconds <= 0 or interval_ms <= 0:
+        return jsonify({'code': 400, 'msg': 'seconds / interval_ms must be positive'})
+
+    threads = request.args.get('threads')
+    threads = tuple(t.strip() for t in threads.split(',') if t.strip()) if threads else DEFAULT_THREADS
+    if 'all' in threads: threads = None
+
+    profiler = SamplingProfiler(interval_ms, threads, lines=request.args.get('lines') == '1')
+    try:
+        profiler.run(seconds)
+    except RuntimeError as e:
+        return jsonify({'code': 409, 'msg': str(e)}), 409
+
+    summary = profiler.summary()
+    headers = {f"X-Profile-{k.replace('_', '-').title()}": str(v) for k, v in summary.items()}
+    if fmt == 'pstats':
+        headers['Content-Disposition'] = 'attachment;filename=profile.pstats'
+        return Response(profiler.pstats_dump(), mimetype='application/octet-stream', headers=headers)
+    return Response(profiler.collapsed(), mimetype='text/plain', headers=headers)
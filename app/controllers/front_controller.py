@@ -1,12 +1,10 @@
 from flask import Blueprint, request, jsonify, Response
 from app import db
-from app.models import Room, Customer, Invoice, DetailRecord
+from app.models import Room, Customer, DetailRecord
 from app.services.bill_service import BillService
+from app.services.export_service import ExportService
 from app.core.scheduler import Scheduler
-from config import SystemConstants
-import csv
-import io
-from datetime import datetime
+from app.core import serialization
 
 front_bp = Blueprint('front_bp', __name__)
 
@@ -24,6 +22,7 @@ def check_in():
         customer = Customer(customer_id=customer_id, name="Guest", id_number=id_number)
         db.session.add(customer)
     room.check_in(customer_id)
+    Scheduler().sync_room(room_id)
     return jsonify({'code': 200, 'msg': 'Check-in Success'})
 
 
@@ -31,59 +30,160 @@ def check_in():
 def check_out():
     data = request.get_json()
     room_id = data.get('room_id')
-    invoice = BillService.create_invoice(room_id)
+    scheduler = Scheduler()
+    # 调度器先关机结算，开票与退房在其锁内完成
+    with scheduler.checking_out([room_id]):
+        invoice = BillService.create_invoice(room_id)
+        if invoice: Room.query.get(room_id).check_out()
     if not invoice: return jsonify({'code': 500, 'msg': 'Failed'})
-    Room.query.get(room_id).check_out()
+    ExportService.prefetch([room_id], scheduler.simulation_start_time)
     return jsonify({'code': 200, 'msg': 'Success', 'data': invoice.to_dict()})
 
 
-@front_bp.route('/exportBill/<room_id>', methods=['GET'])
-def export_bill(room_id):
-    invoice = Invoice.query.filter_by(room_id=room_id).order_by(Invoice.create_time.desc()).first()
-    if not invoice: return "No Invoice"
-
-    output = io.StringIO()
-    output.write('\ufeff')
-    writer = csv.writer(output)
-    writer.writerow(['房间号', '入住时间', '离开时间', '入住天数', '空调费', '住宿费', '总费用'])
-    writer.writerow([
-        invoice.room_id,
-        invoice.check_in_date.strftime('%Y-%m-%d %H:%M:%S'),
-        invoice.check_out_date.strftime('%Y-%m-%d %H:%M:%S'),
-        invoice.stay_days,
-        f"{invoice.ac_fee:.2f}", f"{invoice.accommodation_fee:.2f}", f"{invoice.total_amount:.2f}"
-    ])
-    return Response(output.getvalue().encode('gbk', 'ignore'), mimetype="text/csv",
-                    headers={"Content-Disposition": f"attachment;filename=bill_{room_id}.csv"})
-
+@front_bp.route('/batchCheckIn', methods=['POST'])
+def batch_check_in():
+    """
+    团队入住：{"rooms": [{"room_id", "customer_id", "id_number"}, ...]}，
+    条目中缺省的 customer_id / id_number 取请求顶层的值。全部成功或全部不生效。
+    """
+    data = request.get_json() or {}
+    entries = []
+    for e in data.get('rooms', []):
+        if not isinstance(e, dict): e = {'room_id': e}
+        entries.append((str(e.get('room_id')), e.get('customer_id', data.get('customer_id')),
+                        e.get('id_number', data.get('id_number'))))
+    if not entries or any(not cid for _, cid, _ in entries):
+        return jsonify({'code': 400, 'msg': 'room_id and customer_id required'})
+
+    room_ids = [rid for rid, _, _ in entries]
+    rooms = {r.room_id: r for r in Room.query.filter(Room.room_id.in_(room_ids)).all()}
+    missing = [rid for rid in room_ids if rid not in rooms]
+    if missing: return jsonify({'code': 404, 'msg': 'No Room', 'data': missing})
+
+    try:
+        known = {c.customer_id for c in Customer.query.filter(
+            Customer.customer_id.in_({cid for _, cid, _ in entries})).all()}
+        for rid, cid, id_number in entries:
+            if cid not in known:
+                db.session.add(Customer(customer_id=cid, name="Guest", id_number=id_number))
+                known.add(cid)
+            rooms[rid].check_in(cid, commit=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error in batch check-in: {e}")
+        return jsonify({'code': 500, 'msg': 'Failed'})
+
+    Scheduler().sync_rooms(room_ids)
+    return jsonify({'code': 200, 'msg': f'Check-in Success ({len(room_ids)} rooms)'})
+
+
+@front_bp.route('/batchCheckOut', methods=['POST'])
+def batch_check_out():
+    """
+    团队退房：{"room_ids": [...]}。所有账单用分组查询一次算出，与退房在同一事务中提交，
+    返回合并账单。
+    """
+    data = request.get_json() or {}
+    room_ids = [str(rid) for rid in data.get('room_ids', [])]
+    if not room_ids: return jsonify({'code': 400, 'msg': 'room_ids required'})
+
+    found = {rid for rid, in db.session.query(Room.room_id).filter(Room.room_id.in_(room_ids))}
+    missing = [rid for rid in room_ids if rid not in found]
+    if missing: return jsonify({'code': 404, 'msg': 'No Room', 'data': missing})
+    # 结束本次读事务，之后的查询才能看到调度器提交的详单结算
+    db.session.commit()
 
-@front_bp.route('/exportDetail/<room_id>', methods=['GET'])
-def export_detail(room_id):
-    records = DetailRecord.query.filter_by(room_id=room_id).order_by(DetailRecord.start_time).all()
     scheduler = Scheduler()
-    sim_start = scheduler.simulation_start_time
+    # 调度器先关机结算，开票与退房在其锁内完成
+    with scheduler.checking_out(room_ids):
+        try:
+            rooms = Room.query.filter(Room.room_id.in_(room_ids)).all()
+            invoices = BillService.create_invoices(rooms, commit=False)
+            # 提交前序列化，避免提交后逐张刷新过期的账单对象
+            items = [inv.to_dict() for inv in invoices]
+            for room in rooms:
+                room.check_out(commit=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error in batch check-out: {e}")
+            return jsonify({'code': 500, 'msg': 'Failed'})
+
+    ExportService.prefetch(room_ids, scheduler.simulation_start_time)
+    return jsonify({'code': 200, 'msg': 'Success', 'data': {
+        'invoices': items,
+        'room_count': len(items),
+        'ac_fee': round(sum(i['ac_fee'] or 0.0 for i in items), 4),
+        'accommodation_fee': round(sum(i['accommodation_fee'] or 0.0 for i in items), 2),
+        'total_amount': round(sum(i['total_amount'] or 0.0 for i in items), 2)
+    }})
+
+
+@front_bp.route('/details/<room_id>', methods=['GET'])
+def list_details(room_id):
+    """房间详单 JSON，支持 ?fields= 投影和 ?format=columnar"""
+    try:
+        fields = serialization.parse_fields(request.args.get('fields'), serialization.RECORD_FIELDS)
+        fmt = serialization.parse_format(request.args.get('format'))
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': str(e)})
+
+    columns = [getattr(DetailRecord, f) for f in serialization.RECORD_FIELDS]
+    rows = db.session.query(*columns).filter(DetailRecord.room_id == room_id) \
+        .order_by(DetailRecord.start_time).all()
+    data = serialization.shape([serialization.record_row(r) for r in rows],
+                               serialization.RECORD_FIELDS, fields, fmt)
+    return serialization.json_response({'code': 200, 'data': data})
+
+
+def _csv_response(result):
+    body, filename = result
+    return Response(body, mimetype="text/csv", headers={"Content-Disposition": f"attachment;filename={filename}"})
+
+
+def _job_response(job):
+    """已完成的任务返回 CSV；仍在渲染返回 202 和任务号，之后从 /exports/<job_id>/download 下载"""
+    status = job.status()
+    if status == 'PENDING': return jsonify({'code': 202, 'data': job.to_dict()}), 202
+    if status == 'FAILED': return jsonify({'code': 500, 'data': job.to_dict()})
+    result = job.future.result()
+    if not result: return "No Invoice"
+    return _csv_response(result)
 
-    output = io.StringIO()
-    output.write('\ufeff')
-    writer = csv.writer(output)
-    writer.writerow(['房间', '请求时刻(分)', '开始(分)', '结束(分)', '时长(s)', '风速', '费率', '费用', '累积'])
 
-    cumulative = 0.0
-    for r in records:
-        d_start = (r.start_time - sim_start).total_seconds()
-        sys_start = (d_start * SystemConstants.TIME_KX) / 60.0
-        if sys_start < 0: sys_start = 0.0  # Clamp negative
+@front_bp.route('/exportBill/<room_id>', methods=['GET'])
+def export_bill(room_id):
+    return _job_response(ExportService.export('bill', room_id))
 
-        duration_sec = float(r.duration)
-        sys_end = sys_start + (duration_sec / 60.0)  # 强制自洽
 
-        fee = float(r.fee) if r.fee else 0.0
-        cumulative += fee
+@front_bp.route('/exportDetail/<room_id>', methods=['GET'])
+def export_detail(room_id):
+    return _job_response(ExportService.export('detail', room_id, Scheduler().simulation_start_time))
 
-        writer.writerow([
-            r.room_id, f"{sys_start:.2f}", f"{sys_start:.2f}", f"{sys_end:.2f}",
-            f"{duration_sec:.0f}", r.fan_speed, f"{float(r.fee_rate):.2f}", f"{fee:.2f}", f"{cumulative:.2f}"
-        ])
 
-    return Response(output.getvalue().encode('gbk', 'ignore'), mimetype="text/csv",
-                    headers={"Content-Disposition": f"attachment;filename=detail_{room_id}.csv"})
\ No newline at end of file
+@front_bp.route('/exports', methods=['POST'])
+def submit_export():
+    """异步导出：{"type": "bill" | "detail", "room_id"}，返回任务号，完成后从 /exports/<job_id>/download 下载"""
+    data = request.get_json() or {}
+    room_id = data.get('room_id')
+    if not room_id: return jsonify({'code': 400, 'msg': 'room_id required'})
+    try:
+        job = ExportService.submit(data.get('type', 'bill'), str(room_id), Scheduler().simulation_start_time)
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': str(e)})
+    return jsonify({'code': 200, 'data': job.to_dict()})
+
+
+@front_bp.route('/exports/<job_id>', methods=['GET'])
+def export_status(job_id):
+    job = ExportService.get_job(job_id)
+    if not job: return jsonify({'code': 404, 'msg': 'No Job'})
+    return jsonify({'code': 200, 'data': job.to_dict()})
+
+
+@front_bp.route('/exports/<job_id>/download', methods=['GET'])
+def export_download(job_id):
+    job = ExportService.get_job(job_id)
+    if not job: return jsonify({'code': 404, 'msg': 'No Job'})
+    return _job_response(job)
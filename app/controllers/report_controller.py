@@ -0,0 +1,33 @@
+from flask import Blueprint, request, jsonify
+from app.services.report_service import ReportService
+from datetime import datetime, timedelta
+
+report_bp = Blueprint('report_bp', __name__)
+
+
+def _parse_range(default_days):
+    end = request.args.get('end')
+    start = request.args.get('start')
+    end = datetime.strptime(end, '%Y-%m-%d').date() if end else datetime.now().date()
+    start = datetime.strptime(start, '%Y-%m-%d').date() if start else end - timedelta(days=default_days - 1)
+    return start, end
+
+
+@report_bp.route('/daily', methods=['GET'])
+def daily_report():
+    try:
+        start, end = _parse_range(7)
+    except ValueError:
+        return jsonify({'code': 400, 'msg': 'Date format: YYYY-MM-DD'})
+    data = ReportService.build_report(start, end, request.args.get('room_id'), period='day')
+    return jsonify({'code': 200, 'data': data})
+
+
+@report_bp.route('/weekly', methods=['GET'])
+def weekly_report():
+    try:
+        start, end = _parse_range(28)
+    except ValueError:
+        return jsonify({'code': 400, 'msg': 'Date format: YYYY-MM-DD'})
+    data = ReportService.build_report(start, end, request.args.get('room_id'), period='week')
+    return jsonify({'code': 200, 'data': data})
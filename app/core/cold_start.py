@@ -0,0 +1,100 @@
+"""
+冷启动测量：每轮启动一个全新的解释器，分别记录
+- core: 只导入物理/计费核心 (policy_harness) 的耗时，并确认没有加载 Flask / SQLAlchemy；
+- import: import run；
+- create_app: 构建应用 (Flask、模型、蓝图)；
+- first_request: 第一个请求 (GET /api/ac/powerStatus，会构造调度器但不访问数据库)。
+进程启动到第一个请求返回的中位数超过 COLD_START_BUDGET_MS 时退出码为 1。
+
+用法: python -m app.core.cold_start --runs 5
+"""
+from config import SystemConstants
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_CORE_PROBE = """
+import json, sys, time
+t = time.perf_counter()
+import app.core.policy_harness
+print(json.dumps({'core': (time.perf_counter() - t) * 1000.0,
+                  'core_loads_flask': 'flask' in sys.modules or 'sqlalchemy' in sys.modules}))
+"""
+
+_APP_PROBE = """
+import json, time
+t0 = time.perf_counter()
+import run
+t1 = time.perf_counter()
+app = run.get_app()
+t2 = time.perf_counter()
+resp = app.test_client().get('/api/ac/powerStatus')
+t3 = time.perf_counter()
+print(json.dumps({'import': (t1 - t0) * 1000.0, 'create_app': (t2 - t1) * 1000.0,
+                  'first_request': (t3 - t2) * 1000.0, 'status': resp.status_code}))
+"""
+
+
+def _probe(code):
+    """在新解释器中运行探针，返回其输出的计时"""
+    out = subprocess.run([sys.executable, '-c', code], cwd=_ROOT, capture_output=True, text=True, check=True)
+    return json.loads([l for l in out.stdout.splitlines() if l.startswith('{')][-1])
+
+
+def _interpreter_ms():
+    import time
+    t = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], check=True)
+    return (time.perf_counter() - t) * 1000.0
+
+
+def measure(runs=5):
+    rows = []
+    for _ in range(runs):
+        row = _probe(_CORE_PROBE)
+        row.update(_probe(_APP_PROBE))
+        row['total'] = row['import'] + row['create_app'] + row['first_request']
+        rows.append(row)
+    return rows
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure cold start to first request')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=SystemConstants.COLD_START_BUDGET_MS)
+    args = parser.parse_args(argv)
+
+    rows = measure(args.runs)
+    interp = _interpreter_ms()
+    print(f"{'phase':>16}{'median ms':>12}{'max ms':>10}")
+    for key in ['core', 'import', 'create_app', 'first_request', 'total']:
+        values = [r[key] for r in rows]
+        print(f"{key:>16}{_median(values):>12.1f}{max(values):>10.1f}")
+    print(f"{'(interpreter)':>16}{interp:>12.1f}")
+
+    failed = []
+    if any(r['core_loads_flask'] for r in rows):
+        failed.append('physics/billing core imports Flask or SQLAlchemy')
+    if any(r['status'] != 200 for r in rows):
+        failed.append('first request failed')
+    total = _median([r['total'] for r in rows]) + interp
+    print(f">>> [ColdStart] process start to first response ~{total:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    if total > args.budget_ms:
+        failed.append('over budget')
+    if failed:
+        print(f">>> [ColdStart] FAILED: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
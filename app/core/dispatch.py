@@ -0,0 +1,129 @@
+"""
+服务队列的调度决策流程，Scheduler (在线) 与 PolicySimulation (离线对比) 共用，
+保证对比工具的结果与线上行为一致。这里只负责"什么时候问策略、按什么顺序移动队列"，
+具体决策由 SchedulingPolicy 给出；入队/出队的副作用 (详单、功率表、等待统计) 由宿主实现。
+
+宿主需要提供:
+  rooms / service_queue / wait_queue / service_start_times / wait_start_times / policy
+  _make_candidate(room)  _needs_service(room)
+  _add_to_service(room, original_start_time=None)  _remove_from_service(room_id)
+  _add_to_wait(room)  _remove_from_wait(room_id)
+可选覆盖 _free_reserved()：释放一份非服务占用 (如预冷) 的容量，真正请求送风的房间优先。
+"""
+
+
+class QueueDispatcher:
+
+    def _log(self, msg):
+        pass
+
+    def _free_reserved(self):
+        """释放一份预留容量，返回是否释放了"""
+        return False
+
+    def _service_candidates(self):
+        serving = []
+        for rid in self.service_queue:
+            r = self.rooms.get(rid)
+            if not r: continue
+            serving.append(self._make_candidate(r))
+        return serving
+
+    def _move_to_wait(self, room):
+        self._remove_from_service(room.room_id)
+        self._add_to_wait(room)
+
+    def _move_to_service(self, room):
+        self._remove_from_wait(room.room_id)
+        self._add_to_service(room)
+
+    def _handle_scheduling(self, room_id):
+        """房间 (重新) 请求送风：有容量直接服务，否则尝试抢占，再否则进入等待"""
+        room = self.rooms.get(room_id)
+        if not room: return
+
+        old_svc_time = self.service_start_times.get(room_id)
+
+        self._remove_from_service(room_id)
+        self._remove_from_wait(room_id)
+
+        req = self._make_candidate(room)
+        serving = self._service_candidates()
+
+        fits = self.policy.has_capacity(req, serving)
+        while not fits and self._free_reserved():
+            fits = self.policy.has_capacity(req, serving)
+        if fits:
+            self._add_to_service(room, original_start_time=old_svc_time)
+            return
+
+        target_to_kick = self.policy.select_victim(req, serving)
+        if target_to_kick:
+            self._log(f">>> [Preempt] R{room_id} kicks R{target_to_kick}")
+            self._move_to_wait(self.rooms[target_to_kick])
+            self._add_to_service(room, original_start_time=old_svc_time)
+            return
+
+        self._add_to_wait(room)
+
+    def _schedule_next(self):
+        """空出服务位时从等待队列补位，直到策略不再选出房间 (一个高风房间释放的功率可容纳多个低风房间)"""
+        while self.wait_queue:
+            waiting = []
+            for rid in list(self.wait_queue):
+                r = self.rooms.get(rid)
+                if not r or not self._needs_service(r):
+                    self._remove_from_wait(rid)
+                    continue
+                waiting.append(self._make_candidate(r))
+
+            best = self.policy.select_next(waiting, self._service_candidates())
+            if not best:
+                if waiting and self._free_reserved(): continue
+                return
+            self._log(f">>> [Fill Slot] R{best} starts service")
+            self._move_to_service(self.rooms[best])
+
+    def _tick_time_slice_check(self):
+        """时间片轮转：每个 tick 最多轮换一对"""
+        if not self.wait_queue: return
+
+        waiting = []
+        for wid in self.wait_queue:
+            if wid not in self.wait_start_times: continue
+            r = self.rooms.get(wid)
+            if not r: continue
+            waiting.append(self._make_candidate(r))
+
+        pair = self.policy.select_rotation(waiting, self._service_candidates())
+        if pair:
+            wid, sid = pair
+            self._log(f">>> [RR Slice] R{wid} rotates R{sid}")
+            self._move_to_wait(self.rooms[sid])
+            self._move_to_service(self.rooms[wid])
+
+    def _check_dynamic_preemption(self):
+        """动态抢占：每个 tick 最多交换一对"""
+        if not self.wait_queue: return
+
+        waiting = []
+        for rid in self.wait_queue:
+            r = self.rooms.get(rid)
+            if not r or not self._needs_service(r): continue
+            waiting.append(self._make_candidate(r))
+
+        pair = self.policy.select_swap(waiting, self._service_candidates())
+        if pair:
+            wid, sid = pair
+            self._log(f">>> [Dynamic Swap] R{wid} replaces R{sid}")
+            self._move_to_wait(self.rooms[sid])
+            self._move_to_service(self.rooms[wid])
+
+    def _check_idle_room(self, room):
+        """已开机但既不在服务也不在等待的房间 (达标后回温)，需要时重新请求调度"""
+        rid = room.room_id
+        if room.power_status == 'ON' and rid not in self.service_start_times and \
+                rid not in self.wait_start_times and self._needs_service(room):
+            self._handle_scheduling(rid)
+            return True
+        return False
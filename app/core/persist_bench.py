@@ -0,0 +1,109 @@
+"""
+tick 持久化基准：对比 CASE / EXECUTEMANY / ORM 三种写回方式在不同房间数下的耗时与语句数。
+默认使用临时 sqlite 文件，--db 可指向独立的 MySQL 测试库 (会建表并写入 BENCH 开头的房间)。
+
+用法: python -m app.core.persist_bench --rooms 10,100,1000 --ticks 20
+"""
+from config import Config, SystemConstants
+from sqlalchemy import event
+import argparse
+import os
+import tempfile
+import time
+
+MODES = ['CASE', 'EXECUTEMANY', 'ORM']
+
+
+def _make_app(uri):
+    Config.SQLALCHEMY_DATABASE_URI = uri
+    if uri.startswith('sqlite'):
+        Config.SQLALCHEMY_ENGINE_OPTIONS = {}
+    from app import create_app, db
+    app = create_app()
+    db.app = app
+    return app, db
+
+
+def _seed(db, n):
+    from app.models import Room, DetailRecord
+    from app.core.runtime import RoomRuntime
+    from datetime import datetime
+
+    DetailRecord.query.filter(DetailRecord.room_id.like('BENCH%')).delete(synchronize_session=False)
+    Room.query.filter(Room.room_id.like('BENCH%')).delete(synchronize_session=False)
+    ids = [f"BENCH{i:05d}" for i in range(n)]
+    db.session.add_all([Room(room_id=rid, current_temp=30.0, target_temp=25.0) for rid in ids])
+    db.session.flush()
+    records = [DetailRecord(room_id=rid, start_time=datetime.now(), fan_speed='MID',
+                            fee_rate=SystemConstants.FEE_RATE_MID, fee=0.0, duration=0.0) for rid in ids]
+    db.session.add_all(records)
+    db.session.commit()
+
+    runtimes = []
+    for rid, record in zip(ids, records):
+        rt = RoomRuntime(rid, current_temp=30.0, target_temp=25.0, fan_speed='MID')
+        rt.attach_record(record)
+        runtimes.append(rt)
+    return runtimes
+
+
+def run(n_rooms, ticks, db):
+    from app.core.persistence import persist
+    runtimes = _seed(db, n_rooms)
+    counter = {'n': 0}
+
+    def _count(*args):
+        counter['n'] += 1
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _count)
+    results = {}
+    try:
+        for mode in MODES:
+            counter['n'] = 0
+            start = time.perf_counter()
+            for _ in range(ticks):
+                for rt in runtimes:
+                    rt.current_temp = round(rt.current_temp - 0.01, 4)
+                    rt.current_fee += 0.01
+                    rt.total_fee += 0.01
+                    rt.record_fee += 0.01
+                    rt.record_duration += 3.0
+                persist(db.session, runtimes, mode)
+                db.session.commit()
+            elapsed = time.perf_counter() - start
+            results[mode] = (elapsed / ticks * 1000.0, counter['n'] / ticks)
+    finally:
+        event.remove(engine, 'before_cursor_execute', _count)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark per-tick room persistence')
+    parser.add_argument('--rooms', default='10,100,1000')
+    parser.add_argument('--ticks', type=int, default=20)
+    parser.add_argument('--db', default=None, help='SQLAlchemy URI (default: temporary sqlite file)')
+    args = parser.parse_args(argv)
+
+    tmp = None
+    uri = args.db
+    if not uri:
+        tmp = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        tmp.close()
+        uri = f"sqlite:///{tmp.name}"
+
+    app, db = _make_app(uri)
+    try:
+        with app.app_context():
+            db.create_all()
+            print(f"{'rooms':>7}" + ''.join(f"{m + ' ms/tick':>20}{'stmts':>7}" for m in MODES))
+            for n in [int(x) for x in args.rooms.split(',')]:
+                res = run(n, args.ticks, db)
+                print(f"{n:>7}" + ''.join(f"{res[m][0]:>20.2f}{res[m][1]:>7.0f}" for m in MODES))
+    finally:
+        if tmp:
+            os.remove(tmp.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+tick 持久化：把 RoomRuntime 的物理字段写回 room / detail_record。
+
+CASE      : 每张表一条 UPDATE ... SET col = CASE id WHEN ... END WHERE id IN (...)，
+            语句数与房间数无关 (按 CASE_CHUNK 分块，避免单条 SQL 过长)
+EXECUTEMANY: 每张表一次 executemany (驱动是否合并成一次往返取决于 DB-API)
+ORM       : 原有的工作单元逐行 UPDATE，保留作对照 (见 app.core.persist_bench)
+"""
+from app.models import Room, DetailRecord
+from sqlalchemy import bindparam, case
+
+CASE_CHUNK = 500
+
+_room = Room.__table__
+_record = DetailRecord.__table__
+
+ROOM_UPDATE = _room.update() \
+    .where(_room.c.room_id == bindparam('b_room_id')) \
+    .values(current_temp=bindparam('b_current_temp'),
+            current_fee=bindparam('b_current_fee'),
+            total_fee=bindparam('b_total_fee'))
+
+RECORD_UPDATE = _record.update() \
+    .where(_record.c.record_id == bindparam('b_record_id')) \
+    .values(fee=bindparam('b_fee'), duration=bindparam('b_duration'))
+
+
+def persist(session, dirty, mode='EXECUTEMANY'):
+    # 按 ID 排序，保证多线程写入时加锁顺序一致 (防死锁)
+    dirty = sorted(dirty, key=lambda rt: rt.room_id)
+    if mode == 'ORM':
+        persist_orm(session, dirty)
+    elif mode == 'CASE':
+        persist_case(session, dirty)
+    else:
+        persist_executemany(session, dirty)
+
+
+def persist_case(session, dirty):
+    for i in range(0, len(dirty), CASE_CHUNK):
+        chunk = dirty[i:i + CASE_CHUNK]
+        ids = [rt.room_id for rt in chunk]
+        key = _room.c.room_id
+        session.execute(
+            _room.update().where(key.in_(ids)).values(
+                current_temp=case({rt.room_id: rt.current_temp for rt in chunk}, value=key),
+                current_fee=case({rt.room_id: rt.current_fee for rt in chunk}, value=key),
+                total_fee=case({rt.room_id: rt.total_fee for rt in chunk}, value=key)
+            )
+        )
+
+        open_rt = [rt for rt in chunk if rt.record_id is not None]
+        if open_rt:
+            rkey = _record.c.record_id
+            session.execute(
+                _record.update().where(rkey.in_([rt.record_id for rt in open_rt])).values(
+                    fee=case({rt.record_id: rt.record_fee for rt in open_rt}, value=rkey),
+                    duration=case({rt.record_id: rt.record_duration for rt in open_rt}, value=rkey)
+                )
+            )
+
+
+def persist_executemany(session, dirty):
+    session.execute(ROOM_UPDATE, [
+        {'b_room_id': rt.room_id, 'b_current_temp': rt.current_temp,
+         'b_current_fee': rt.current_fee, 'b_total_fee': rt.total_fee}
+        for rt in dirty
+    ])
+    records = [
+        {'b_record_id': rt.record_id, 'b_fee': rt.record_fee, 'b_duration': rt.record_duration}
+        for rt in dirty if rt.record_id is not None
+    ]
+    if records:
+        session.execute(RECORD_UPDATE, records)
+
+
+def persist_orm(session, dirty):
+    by_id = {rt.room_id: rt for rt in dirty}
+    for room in Room.query.filter(Room.room_id.in_(list(by_id))).order_by(Room.room_id).all():
+        by_id[room.room_id].apply_to(room)
+
+    record_rooms = {rt.record_id: rt for rt in dirty if rt.record_id is not None}
+    if record_rooms:
+        for record in DetailRecord.query.filter(DetailRecord.record_id.in_(list(record_rooms))).all():
+            record_rooms[record.record_id].apply_record_to(record)
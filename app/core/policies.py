@@ -0,0 +1,266 @@
+from config import SystemConstants
+
+
+# ================= 风速参数 =================
+
+def fan_priority(fan):
+    f = str(fan).strip().upper()
+    if f == 'HIGH': return 3
+    if f in ['MEDIUM', 'MID']: return 2
+    return 1
+
+
+def fan_fee_rate(fan):
+    if not fan: return 0.5
+    f = str(fan).strip().upper()
+    if f == 'HIGH': return float(SystemConstants.FEE_RATE_HIGH)
+    if f in ['MEDIUM', 'MID']: return float(SystemConstants.FEE_RATE_MID)
+    if f == 'LOW': return float(SystemConstants.FEE_RATE_LOW)
+    return 0.5
+
+
+def fan_temp_rate(fan):
+    f = str(fan).strip().upper()
+    if f == 'HIGH': return SystemConstants.TEMP_XH_HIGH
+    if f in ['MEDIUM', 'MID']: return SystemConstants.TEMP_XH_MID
+    if f == 'LOW': return SystemConstants.TEMP_XH_LOW
+    return 0.5
+
+
+def fan_power_kw(fan):
+    f = str(fan).strip().upper()
+    if f == 'MEDIUM': f = 'MID'
+    return float(SystemConstants.FAN_POWER_KW.get(f, SystemConstants.FAN_POWER_KW['MID']))
+
+
+class RoomCandidate:
+    """
+    调度策略看到的房间快照 (与 ORM 无关，调度器和离线仿真共用)
+    served / waited / served_total 均为系统时间秒
+    """
+    __slots__ = ('room_id', 'fan_speed', 'priority', 'fee_rate', 'temp_rate',
+                 'delta', 'served', 'waited', 'served_total')
+
+    def __init__(self, room_id, fan_speed, delta=0.0, served=0.0, waited=0.0, served_total=0.0):
+        self.room_id = room_id
+        self.fan_speed = fan_speed
+        self.priority = fan_priority(fan_speed)
+        self.fee_rate = fan_fee_rate(fan_speed)
+        self.temp_rate = fan_temp_rate(fan_speed)
+        self.delta = delta
+        self.served = served
+        self.waited = waited
+        self.served_total = served_total
+
+    def remaining_sec(self):
+        """按当前风速到达目标温度还需要的系统秒数"""
+        if self.temp_rate <= 0: return float('inf')
+        return self.delta / (self.temp_rate / 60.0)
+
+
+# ================= 策略 =================
+
+class SchedulingPolicy:
+    """
+    调度策略接口。所有方法只做决策，不修改队列；
+    waiting / serving 为 RoomCandidate 列表，顺序与调度器队列一致。
+    """
+    name = 'BASE'
+    meter = None
+
+    def attach_meter(self, meter):
+        """绑定调度器的 PowerMeter (功率类策略需要实时负荷)"""
+        self.meter = meter
+
+    def has_capacity(self, req, serving):
+        """服务队列是否还能直接接纳 req"""
+        return len(serving) < SystemConstants.MAX_SERVICE
+
+    def over_capacity(self, units):
+        """占用服务位的房间总数为 units 时是否已超出容量 (预冷借位时使用)"""
+        return units > SystemConstants.MAX_SERVICE
+
+    def select_victim(self, req, serving):
+        """服务队列已满时，返回被 req 抢占的房间号，或 None (req 进入等待)"""
+        return None
+
+    def select_next(self, waiting, serving):
+        """空出服务位时，返回下一个进入服务的等待房间号，或 None"""
+        return None
+
+    def select_swap(self, waiting, serving):
+        """每个 tick 的动态抢占，返回 (等待房间号, 服务房间号) 或 None"""
+        return None
+
+    def select_rotation(self, waiting, serving):
+        """每个 tick 的时间片轮转，返回 (等待房间号, 服务房间号) 或 None"""
+        return None
+
+
+class PriorityRoundRobinPolicy(SchedulingPolicy):
+    """
+    默认策略：风速优先级 + 抢占 + 同优先级时间片轮转
+    """
+    name = 'PRIORITY_RR'
+
+    def select_victim(self, req, serving):
+        lowest = self._lowest_priority(serving)
+        if not lowest or req.priority <= lowest[0].priority: return None
+        lowest.sort(key=lambda c: c.served, reverse=True)
+        return lowest[0].room_id
+
+    def select_next(self, waiting, serving):
+        if not waiting or not self.has_capacity(None, serving): return None
+        best = sorted(waiting, key=lambda c: (-c.priority, -c.waited))[0]
+        return best.room_id
+
+    def select_swap(self, waiting, serving):
+        min_serv = None
+        for c in serving:
+            if min_serv is None or c.priority < min_serv.priority:
+                min_serv = c
+            elif c.priority == min_serv.priority and c.served > min_serv.served:
+                min_serv = c
+        if not min_serv: return None
+
+        max_wait = None
+        for c in waiting:
+            if max_wait is None or c.priority > max_wait.priority:
+                max_wait = c
+        if not max_wait: return None
+
+        if max_wait.priority > min_serv.priority:
+            return max_wait.room_id, min_serv.room_id
+        return None
+
+    def select_rotation(self, waiting, serving):
+        for w in waiting:
+            if w.waited < SystemConstants.TIME_SLICE: continue
+            target = None
+            for s in serving:
+                if s.priority != w.priority: continue
+                if target is None or s.served > target.served:
+                    target = s
+            if target:
+                return w.room_id, target.room_id
+        return None
+
+    def _lowest_priority(self, serving):
+        if not serving: return []
+        low = min(c.priority for c in serving)
+        return [c for c in serving if c.priority == low]
+
+
+class WeightedFairPolicy(SchedulingPolicy):
+    """
+    加权公平队列：按 本会话累计服务时长 / 风速权重 计算虚拟时间，
+    虚拟时间最小者优先；差距超过一个时间片才抢占，避免频繁切换
+    """
+    name = 'WFQ'
+
+    def _vtime(self, c):
+        return c.served_total / c.priority
+
+    def select_victim(self, req, serving):
+        if not serving: return None
+        victim = max(serving, key=self._vtime)
+        if self._vtime(victim) - self._vtime(req) >= SystemConstants.TIME_SLICE:
+            return victim.room_id
+        return None
+
+    def select_next(self, waiting, serving):
+        if not waiting or not self.has_capacity(None, serving): return None
+        return min(waiting, key=lambda c: (self._vtime(c), -c.waited)).room_id
+
+    def select_swap(self, waiting, serving):
+        if not waiting or not serving: return None
+        best = min(waiting, key=lambda c: (self._vtime(c), -c.waited))
+        victim = self.select_victim(best, serving)
+        if victim: return best.room_id, victim
+        return None
+
+
+class ShortestDeltaFirstPolicy(SchedulingPolicy):
+    """
+    最短剩余温差优先：按到达目标所需时间排序，尽快让房间达标以提高吞吐；
+    等待时长作为老化项抵扣剩余时间，防止大温差房间饿死
+    """
+    name = 'SRDF'
+
+    def _score(self, c):
+        return c.remaining_sec() - c.waited
+
+    def select_victim(self, req, serving):
+        if not serving: return None
+        victim = max(serving, key=lambda c: c.remaining_sec())
+        if victim.remaining_sec() - self._score(req) >= SystemConstants.TIME_SLICE:
+            return victim.room_id
+        return None
+
+    def select_next(self, waiting, serving):
+        if not waiting or not self.has_capacity(None, serving): return None
+        return min(waiting, key=self._score).room_id
+
+    def select_swap(self, waiting, serving):
+        if not waiting or not serving: return None
+        best = min(waiting, key=self._score)
+        victim = self.select_victim(best, serving)
+        if victim: return best.room_id, victim
+        return None
+
+
+class EnergyBudgetPolicy(PriorityRoundRobinPolicy):
+    """
+    功率预算：在默认优先级规则基础上，不再按 MAX_SERVICE 台数限流，
+    而是要求服务中房间的总功率 (FAN_POWER_KW) 不超过 POWER_BUDGET_KW，
+    因此同一机组容量下可以同时运行更多低风速房间 (默认预算为 MAX_SERVICE 台高风的功率)。
+    抢占时只选择释放后能容纳请求的房间。
+    """
+    name = 'ENERGY'
+
+    def has_capacity(self, req, serving):
+        if req is None:
+            return self.meter.load_kw < SystemConstants.POWER_BUDGET_KW
+        return self.meter.fits(fan_power_kw(req.fan_speed))
+
+    def over_capacity(self, units):
+        return self.meter.load_kw > SystemConstants.POWER_BUDGET_KW + 1e-9
+
+    def select_victim(self, req, serving):
+        kw = fan_power_kw(req.fan_speed)
+        lowest = [c for c in self._lowest_priority(serving)
+                  if self.meter.fits(kw, freed=self.meter.draw(c.room_id))]
+        if not lowest or req.priority <= lowest[0].priority: return None
+        lowest.sort(key=lambda c: c.served, reverse=True)
+        return lowest[0].room_id
+
+    def select_next(self, waiting, serving):
+        fitting = [c for c in waiting if self.meter.fits(fan_power_kw(c.fan_speed))]
+        return super().select_next(fitting, serving)
+
+    def select_swap(self, waiting, serving):
+        return self._check_pair(super().select_swap(waiting, serving), waiting)
+
+    def select_rotation(self, waiting, serving):
+        return self._check_pair(super().select_rotation(waiting, serving), waiting)
+
+    def _check_pair(self, pair, waiting):
+        if not pair: return None
+        wid, sid = pair
+        w = next(c for c in waiting if c.room_id == wid)
+        return pair if self.meter.fits(fan_power_kw(w.fan_speed), freed=self.meter.draw(sid)) else None
+
+
+POLICIES = {
+    PriorityRoundRobinPolicy.name: PriorityRoundRobinPolicy,
+    WeightedFairPolicy.name: WeightedFairPolicy,
+    ShortestDeltaFirstPolicy.name: ShortestDeltaFirstPolicy,
+    EnergyBudgetPolicy.name: EnergyBudgetPolicy,
+}
+
+
+def create_policy(name=None):
+    key = str(name or SystemConstants.SCHEDULING_POLICY).strip().upper()
+    if key not in POLICIES:
+        raise ValueError(f"Unknown scheduling policy: {key}")
+    return POLICIES[key]()
@@ -0,0 +1,234 @@
+"""
+调度策略离线对比工具：不依赖数据库，按场景脚本 (data/*.csv 格式) 仿真各策略，
+输出 达标吞吐量(间/小时)、平均/p99 等待时长、空调收入、机组能耗。
+
+用法: python -m app.core.policy_harness data/cool.csv --mode COOL --policies all
+"""
+from app.core.policies import POLICIES, RoomCandidate, create_policy, fan_fee_rate
+from app.core.runtime import RoomRuntime, advance, target_reached
+from app.core.power import PowerMeter
+from app.core.dispatch import QueueDispatcher
+from config import SystemConstants
+import argparse
+import csv
+
+
+def load_scenario(path):
+    """读取场景脚本：每行 时刻(系统分钟),房间,动作,温度,风速"""
+    events = []
+    with open(path, encoding='utf-8-sig') as f:
+        for row in csv.reader(f):
+            if len(row) < 3 or not row[0].strip().isdigit(): continue
+            row = [c.strip() for c in row] + ['', '']
+            events.append({
+                'time': int(row[0]), 'room': row[1], 'action': row[2].upper(),
+                'temp': float(row[3]) if row[3] else None,
+                'fan': row[4].upper() if row[4] else None
+            })
+    events.sort(key=lambda e: e['time'])
+    return events
+
+
+class PolicySimulation(QueueDispatcher):
+    """
+    与 Scheduler 共用调度决策流程 (QueueDispatcher) + 物理模型，时间单位为系统秒
+    """
+
+    def __init__(self, policy, mode='COOL', initial_temps=None):
+        self.policy = policy
+        self.power = PowerMeter()
+        self.policy.attach_meter(self.power)
+        self.mode = mode
+        self.config = SystemConstants.HEAT_MODE_DEFAULTS if mode == 'HEAT' else SystemConstants.COOL_MODE_DEFAULTS
+        self.initial_temps = initial_temps if initial_temps is not None else self.config['initial_temps']
+        self.now = 0.0
+        self.rooms = {}
+        self.service_queue = []
+        self.wait_queue = []
+        self.service_start_times = {}
+        self.wait_start_times = {}
+        self.service_totals = {}
+        self.hysteresis = set()
+
+        self.reached_count = 0
+        self.wait_samples = []
+
+    # ---------- 房间与候选 ----------
+
+    def _room(self, room_id):
+        room = self.rooms.get(room_id)
+        if not room:
+            initial = float(self.initial_temps.get(room_id, self.initial_temps.get(str(room_id), 25.0)))
+            room = RoomRuntime(room_id, current_temp=initial, target_temp=self.config['default_target'],
+                               initial_temp=initial)
+            self.rooms[room_id] = room
+        return room
+
+    def _make_candidate(self, room):
+        rid = room.room_id
+        delta = room.current_temp - room.target_temp if self.mode == 'COOL' else room.target_temp - room.current_temp
+        served = self.now - self.service_start_times[rid] if rid in self.service_start_times else 0.0
+        waited = self.now - self.wait_start_times[rid] if rid in self.wait_start_times else 0.0
+        return RoomCandidate(rid, room.fan_speed, delta=max(delta, 0.0), served=served,
+                             waited=waited, served_total=self.service_totals.get(rid, 0.0))
+
+    def _needs_service(self, room):
+        curr, target = room.current_temp, room.target_temp
+        if room.room_id in self.hysteresis:
+            if self.mode == 'COOL' and curr >= target + 1.0 or self.mode != 'COOL' and curr <= target - 1.0:
+                self.hysteresis.discard(room.room_id)
+                return True
+            return False
+        return curr > target if self.mode == 'COOL' else curr < target
+
+    # ---------- 队列操作 ----------
+
+    def _add_to_service(self, room, original_start_time=None):
+        rid = room.room_id
+        if rid not in self.service_queue:
+            self.service_queue.append(rid)
+            self.service_start_times[rid] = original_start_time if original_start_time is not None else self.now
+            self.power.admit(rid, room.fan_speed)
+
+    def _remove_from_service(self, rid):
+        if rid in self.service_queue:
+            self.service_queue.remove(rid)
+            self.service_start_times.pop(rid, None)
+            self.power.release(rid)
+
+    def _add_to_wait(self, room):
+        rid = room.room_id
+        if rid not in self.wait_queue:
+            self.wait_queue.append(rid)
+            self.wait_start_times[rid] = self.now
+
+    def _remove_from_wait(self, rid):
+        if rid in self.wait_queue:
+            self.wait_queue.remove(rid)
+            self.wait_samples.append(self.now - self.wait_start_times.pop(rid))
+
+    # ---------- 调度 (决策流程见 QueueDispatcher) ----------
+
+    def request_power(self, rid, fan, target):
+        room = self._room(rid)
+        room.target_temp = float(target)
+        room.fan_speed = str(fan).strip().upper()
+        room.power_status = 'ON'
+        room.fee_rate = fan_fee_rate(room.fan_speed)
+        self.hysteresis.discard(rid)
+        if not self._needs_service(room):
+            self.hysteresis.add(rid)
+            self._remove_from_service(rid)
+            self._remove_from_wait(rid)
+        else:
+            self._handle_scheduling(rid)
+
+    def stop_power(self, rid):
+        room = self._room(rid)
+        room.power_status = 'OFF'
+        self._remove_from_service(rid)
+        self._remove_from_wait(rid)
+        self.hysteresis.discard(rid)
+        self.service_totals.pop(rid, None)
+        self._schedule_next()
+
+    def apply_event(self, e):
+        room = self._room(e['room'])
+        if e['action'] == 'ON':
+            self.request_power(e['room'], e['fan'] or room.fan_speed,
+                               e['temp'] if e['temp'] is not None else room.target_temp)
+        elif e['action'] == 'OFF':
+            self.stop_power(e['room'])
+        elif e['action'] == 'TEMP':
+            self.request_power(e['room'], room.fan_speed, e['temp'])
+        elif e['action'] == 'FAN':
+            self.request_power(e['room'], e['fan'], room.target_temp)
+
+    # ---------- 物理 ----------
+
+    def tick(self, dt):
+        self.now += dt
+        for rid in sorted(self.rooms):
+            self._update_room(self.rooms[rid], dt)
+        self.power.integrate(dt)
+
+        # 与 Scheduler 物理线程相同：先时间片轮转，再动态抢占
+        self._tick_time_slice_check()
+        self._check_dynamic_preemption()
+
+    def _update_room(self, room, dt):
+        rid = room.room_id
+        is_serving = rid in self.service_start_times and room.power_status == 'ON'
+        effective = advance(room, self.mode, dt, is_serving)
+
+        if is_serving:
+            self.service_totals[rid] = self.service_totals.get(rid, 0.0) + effective
+            if target_reached(room, self.mode):
+                self.reached_count += 1
+                self.hysteresis.add(rid)
+                self._remove_from_service(rid)
+                self._schedule_next()
+
+        self._check_idle_room(room)
+
+    # ---------- 运行 ----------
+
+    def run(self, events, step=6.0, tail_minutes=5):
+        horizon = ((events[-1]['time'] if events else 0) + tail_minutes) * 60.0
+        idx = 0
+        while self.now <= horizon:
+            while idx < len(events) and events[idx]['time'] * 60.0 <= self.now:
+                self.apply_event(events[idx])
+                idx += 1
+            self.tick(step)
+
+        # 仍在等待的房间按截止时刻计入样本
+        for rid in list(self.wait_queue):
+            self._remove_from_wait(rid)
+        return self.report()
+
+    def report(self):
+        hours = self.now / 3600.0 if self.now > 0 else 1.0
+        waits = sorted(self.wait_samples)
+        p99 = waits[min(len(waits) - 1, int(len(waits) * 0.99))] if waits else 0.0
+        return {
+            'policy': self.policy.name,
+            'throughput': self.reached_count / hours,
+            'wait_mean': sum(waits) / len(waits) if waits else 0.0,
+            'wait_p99': p99,
+            'revenue': sum(r.total_fee for r in self.rooms.values()),
+            'energy_kwh': self.power.energy_kwh
+        }
+
+
+def compare_policies(events, mode='COOL', names=None, step=6.0, initial_temps=None):
+    results = []
+    for name in names or list(POLICIES):
+        sim = PolicySimulation(create_policy(name), mode=mode, initial_temps=initial_temps)
+        results.append(sim.run(events, step=step))
+    return results
+
+
+def format_report(results):
+    lines = [f"{'policy':<12}{'reached/h':>12}{'wait_mean(s)':>15}{'wait_p99(s)':>14}{'revenue':>12}{'kWh':>10}"]
+    for r in results:
+        lines.append(f"{r['policy']:<12}{r['throughput']:>12.2f}{r['wait_mean']:>15.1f}"
+                     f"{r['wait_p99']:>14.1f}{r['revenue']:>12.2f}{r['energy_kwh']:>10.2f}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare scheduling policies offline')
+    parser.add_argument('scenario', help='scenario csv, e.g. data/cool.csv')
+    parser.add_argument('--mode', default='COOL', choices=['COOL', 'HEAT'])
+    parser.add_argument('--policies', default='all', help='comma separated, or "all"')
+    parser.add_argument('--step', type=float, default=6.0, help='tick length in system seconds')
+    args = parser.parse_args(argv)
+
+    names = None if args.policies == 'all' else [n.strip().upper() for n in args.policies.split(',')]
+    events = load_scenario(args.scenario)
+    print(format_report(compare_policies(events, mode=args.mode, names=names, step=args.step)))
+
+
+if __name__ == '__main__':
+    main()
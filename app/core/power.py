@@ -0,0 +1,52 @@
+from app.core.policies import fan_power_kw
+from config import SystemConstants
+
+
+class PowerMeter:
+    """
+    中央机组负荷表：记录每个占用服务位 (送风/预冷) 的房间功率，
+    进出服务时 O(1) 维护总负荷，并在每个 tick 积分能耗。
+    """
+
+    def __init__(self):
+        self.draws = {}
+        self.load_kw = 0.0
+        self.energy_kwh = 0.0
+        self.last_tick_kwh = 0.0
+
+    def admit(self, room_id, fan):
+        self.release(room_id)
+        kw = fan_power_kw(fan)
+        self.draws[room_id] = kw
+        self.load_kw += kw
+
+    def release(self, room_id):
+        kw = self.draws.pop(room_id, None)
+        if kw is None: return
+        # 队列清空时归零，避免浮点累计误差
+        self.load_kw = self.load_kw - kw if self.draws else 0.0
+
+    def draw(self, room_id):
+        return self.draws.get(room_id, 0.0)
+
+    def fits(self, kw, freed=0.0):
+        return self.load_kw - freed + kw <= SystemConstants.POWER_BUDGET_KW + 1e-9
+
+    def integrate(self, delta_sys_sec):
+        self.last_tick_kwh = self.load_kw * delta_sys_sec / 3600.0
+        self.energy_kwh += self.last_tick_kwh
+
+    def reset(self):
+        self.draws.clear()
+        self.load_kw = 0.0
+        self.energy_kwh = 0.0
+        self.last_tick_kwh = 0.0
+
+    def to_dict(self):
+        return {
+            'load_kw': round(self.load_kw, 4),
+            'budget_kw': SystemConstants.POWER_BUDGET_KW,
+            'units': len(self.draws),
+            'last_tick_kwh': round(self.last_tick_kwh, 6),
+            'energy_kwh': round(self.energy_kwh, 4)
+        }
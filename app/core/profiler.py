@@ -0,0 +1,144 @@
+"""
+按需采样分析器：在后台线程中定时读取 sys._current_frames()，聚合各线程调用栈。
+不安装 trace/profile 钩子，未运行时没有任何开销；运行时开销只与采样频率有关。
+
+输出格式：
+- collapsed: 每行 "线程;frame;frame... 次数"，可直接交给 flamegraph.pl / speedscope
+- pstats: marshal 序列化的统计字典，可用 pstats.Stats(path) 打开 (时间为采样估算值)
+"""
+from config import SystemConstants
+import marshal
+import os
+import sys
+import threading
+import time
+
+# 调度器物理线程的线程名
+PHYSICS_THREAD = 'ac-physics'
+# werkzeug 多线程服务器的请求线程名中包含该函数名
+REQUEST_THREAD_MARK = 'process_request_thread'
+
+DEFAULT_THREADS = ('physics', 'request')
+
+_run_lock = threading.Lock()
+
+
+def thread_label(thread):
+    if thread.name == PHYSICS_THREAD: return 'physics'
+    if REQUEST_THREAD_MARK in thread.name: return 'request'
+    return thread.name
+
+
+def _short_path(path):
+    for base in sorted((p for p in sys.path if p), key=len, reverse=True):
+        if path.startswith(base + os.sep):
+            return path[len(base) + 1:]
+    return path
+
+
+class SamplingProfiler:
+    """
+    一次性采样会话：run(seconds) 阻塞采样，结束后用 collapsed() / pstats_dump() 取结果。
+    同一时间只允许一个会话运行。
+    """
+
+    def __init__(self, interval_ms=None, threads=DEFAULT_THREADS, lines=False):
+        self.interval = (interval_ms or SystemConstants.PROFILER_INTERVAL_MS) / 1000.0
+        self.threads = set(threads) if threads else None
+        self.lines = lines
+        self.stacks = {}       # (label, (code_key, ...)) -> 次数，栈从外到内
+        self.samples = 0
+        self.elapsed = 0.0
+
+    def run(self, seconds):
+        seconds = min(float(seconds), SystemConstants.PROFILER_MAX_SECONDS)
+        if not _run_lock.acquire(blocking=False):
+            raise RuntimeError("Profiler already running")
+        try:
+            done = threading.Event()
+            sampler = threading.Thread(target=self._sample, args=(seconds, done),
+                                       name='ac-profiler', daemon=True)
+            sampler.start()
+            done.wait(seconds + 5)
+        finally:
+            _run_lock.release()
+        return self
+
+    def _sample(self, seconds, done):
+        me = threading.get_ident()
+        start = time.perf_counter()
+        deadline = start + seconds
+        try:
+            while time.perf_counter() < deadline:
+                labels = {t.ident: thread_label(t) for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me: continue
+                    label = labels.get(ident, 'unknown')
+                    if self.threads is not None and label not in self.threads: continue
+                    key = (label, self._stack(frame))
+                    self.stacks[key] = self.stacks.get(key, 0) + 1
+                self.samples += 1
+                time.sleep(self.interval)
+        finally:
+            self.elapsed = time.perf_counter() - start
+            done.set()
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name, frame.f_lineno))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _frame_name(self, entry, leaf):
+        filename, _, func, lineno = entry
+        name = f"{_short_path(filename)}:{func}"
+        if self.lines or leaf: name += f":{lineno}"
+        return name
+
+    def collapsed(self):
+        """flame graph 折叠栈文本；叶子帧带行号，便于区分在哪个 with lock / 查询上等待"""
+        merged = {}
+        for (label, stack), count in self.stacks.items():
+            last = len(stack) - 1
+            line = ';'.join([label] + [self._frame_name(e, i == last) for i, e in enumerate(stack)])
+            merged[line] = merged.get(line, 0) + count
+        return ''.join(f"{line} {count}\n" for line, count in sorted(merged.items()))
+
+    def pstats_dump(self):
+        """
+        生成 pstats 可读取的统计：tt 为自身采样时间，ct 为包含子调用的采样时间，
+        调用次数按出现样本数计 (采样无法得到真实调用次数)
+        """
+        per_sample = self.elapsed / self.samples if self.samples else self.interval
+        stats = {}
+
+        def func_key(entry):
+            return (entry[0], entry[1], entry[2])
+
+        for (_, stack), count in self.stacks.items():
+            t = count * per_sample
+            seen = set()
+            caller = None
+            for i, entry in enumerate(stack):
+                key = func_key(entry)
+                cc, nc, tt, ct, callers = stats.get(key, (0, 0, 0.0, 0.0, {}))
+                if key not in seen:
+                    # 递归时每个样本只计一次包含时间
+                    ct += t
+                    cc += count
+                    seen.add(key)
+                nc += count
+                if i == len(stack) - 1: tt += t
+                if caller is not None:
+                    c = callers.get(caller, (0, 0, 0.0, 0.0))
+                    callers[caller] = (c[0] + count, c[1] + count, c[2], c[3] + t)
+                stats[key] = (cc, nc, tt, ct, callers)
+                caller = key
+        return marshal.dumps(stats)
+
+    def summary(self):
+        return {'samples': self.samples, 'elapsed': round(self.elapsed, 3),
+                'interval_ms': self.interval * 1000.0, 'stacks': len(self.stacks)}
@@ -0,0 +1,159 @@
+from app.core.policies import fan_fee_rate, fan_temp_rate
+from config import SystemConstants
+
+
+def initial_temp_for(mode, room_id):
+    config = SystemConstants.HEAT_MODE_DEFAULTS if mode == 'HEAT' else SystemConstants.COOL_MODE_DEFAULTS
+    temps = config['initial_temps']
+    try:
+        val = temps.get(int(room_id))
+    except (TypeError, ValueError):
+        val = None
+    if val is None: val = temps.get(str(room_id))
+    return float(val) if val is not None else 25.0
+
+
+class RoomRuntime:
+    """
+    调度器内部使用的轻量房间状态 (替代 tick 中的 ORM 实例)。
+    只在持久化时与 Room / DetailRecord 互相转换；dirty 表示有未写回的物理字段。
+    """
+    __slots__ = ('room_id', 'current_temp', 'target_temp', 'initial_temp', 'fan_speed',
+                 'power_status', 'fee_rate', 'current_fee', 'total_fee', 'active_session_id',
+                 'customer_id', 'status', 'record_id', 'record_fee', 'record_duration', 'dirty')
+
+    def __init__(self, room_id, current_temp=22.0, target_temp=22.0, initial_temp=25.0,
+                 fan_speed='MEDIUM', power_status='OFF', current_fee=0.0, total_fee=0.0,
+                 active_session_id=None):
+        self.room_id = room_id
+        self.current_temp = current_temp
+        self.target_temp = target_temp
+        self.initial_temp = initial_temp
+        self.fan_speed = fan_speed
+        self.power_status = power_status
+        self.fee_rate = fan_fee_rate(fan_speed)
+        self.current_fee = current_fee
+        self.total_fee = total_fee
+        self.active_session_id = active_session_id
+        self.customer_id = None
+        self.status = 'AVAILABLE'
+        # 当前未结束的详单 (record_id 为 None 表示没有)
+        self.record_id = None
+        self.record_fee = 0.0
+        self.record_duration = 0.0
+        self.dirty = False
+
+    @classmethod
+    def from_orm(cls, room, mode='COOL'):
+        rt = cls(room.room_id, initial_temp=initial_temp_for(mode, room.room_id))
+        rt.load(room)
+        return rt
+
+    def load(self, room):
+        self.current_temp = float(room.current_temp or 0.0)
+        self.target_temp = float(room.target_temp or 0.0)
+        self.fan_speed = str(room.fan_speed or 'MEDIUM').strip().upper()
+        self.power_status = room.power_status or 'OFF'
+        self.fee_rate = float(room.fee_rate) if room.fee_rate is not None else fan_fee_rate(self.fan_speed)
+        self.current_fee = float(room.current_fee or 0.0)
+        self.total_fee = float(room.total_fee or 0.0)
+        self.active_session_id = room.active_session_id
+        self.customer_id = room.customer_id
+        self.status = room.status or 'AVAILABLE'
+        self.dirty = False
+
+    def attach_record(self, record):
+        self.record_id = record.record_id
+        self.record_fee = float(record.fee or 0.0)
+        self.record_duration = float(record.duration or 0.0)
+
+    def detach_record(self):
+        self.record_id = None
+        self.record_fee = 0.0
+        self.record_duration = 0.0
+
+    def apply_to(self, room):
+        """写回 tick 负责的物理字段，控制字段由接口方法自行持久化"""
+        room.current_temp = self.current_temp
+        room.current_fee = self.current_fee
+        room.total_fee = self.total_fee
+
+    def apply_record_to(self, record):
+        record.fee = self.record_fee
+        record.duration = self.record_duration
+
+
+def advance(rt, mode, delta_sys_sec, is_serving):
+    """
+    推进单个房间 delta_sys_sec 系统秒的温度与计费，返回本步有效送风时长 (系统秒)
+    """
+    current_temp = rt.current_temp
+    target_temp = rt.target_temp
+    effective_time_sec = 0.0
+
+    if is_serving:
+        rate = fan_temp_rate(rt.fan_speed)
+        temp_delta = (rate / 60.0) * delta_sys_sec
+        effective_time_sec = delta_sys_sec
+
+        if mode == 'COOL':
+            if (current_temp - temp_delta) < target_temp:
+                needed = current_temp - target_temp
+                if needed < 0: needed = 0
+                if rate > 0: effective_time_sec = needed / (rate / 60.0)
+                new_temp = target_temp
+            else:
+                new_temp = current_temp - temp_delta
+        else:
+            if (current_temp + temp_delta) > target_temp:
+                needed = target_temp - current_temp
+                if needed < 0: needed = 0
+                if rate > 0: effective_time_sec = needed / (rate / 60.0)
+                new_temp = target_temp
+            else:
+                new_temp = current_temp + temp_delta
+
+        cost = (fan_fee_rate(rt.fan_speed) / 60.0) * effective_time_sec
+        if cost:
+            rt.current_fee += cost
+            rt.total_fee += cost
+            rt.dirty = True
+        if rt.record_id is not None:
+            rt.record_fee += cost
+            rt.record_duration += effective_time_sec
+    else:
+        step = (SystemConstants.RECOVER_RATE / 60.0) * delta_sys_sec
+        if mode == 'COOL':
+            new_temp = current_temp + step
+            if new_temp > rt.initial_temp: new_temp = rt.initial_temp
+        else:
+            new_temp = current_temp - step
+            if new_temp < rt.initial_temp: new_temp = rt.initial_temp
+
+    new_temp = round(new_temp, 4)
+    if new_temp != current_temp:
+        rt.current_temp = new_temp
+        rt.dirty = True
+    return effective_time_sec
+
+
+def precool_step(rt, mode, delta_sys_sec, target_temp):
+    """
+    预冷/预热：关机房间以低风速向 target_temp 调节，不计费、不产生详单。
+    返回是否已到达目标。
+    """
+    step = (fan_temp_rate('LOW') / 60.0) * delta_sys_sec
+    if mode == 'COOL':
+        new_temp = max(rt.current_temp - step, target_temp)
+    else:
+        new_temp = min(rt.current_temp + step, target_temp)
+    new_temp = round(new_temp, 4)
+    if new_temp != rt.current_temp:
+        rt.current_temp = new_temp
+        rt.dirty = True
+    return new_temp == round(target_temp, 4)
+
+
+def target_reached(rt, mode):
+    if mode == 'COOL': return rt.current_temp <= (rt.target_temp + 0.001)
+    return rt.current_temp >= (rt.target_temp - 0.001)
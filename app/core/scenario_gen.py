@@ -0,0 +1,173 @@
+"""
+大规模场景生成器：输出与 data/*.csv 相同格式的脚本 (时刻(系统分钟),房间,动作,温度,风速)，
+另增 CHECKIN / CHECKOUT 两种动作表示入住与退房 (policy_harness 会忽略它们)。
+
+模型：
+- 入住为非齐次泊松过程，按 ARRIVAL_WEIGHTS 的昼夜曲线 (下午入住高峰) 分配到空房；
+- 住店时长服从指数分布，退房前先关机；
+- 在住房间按 USAGE_WEIGHTS 的昼夜曲线开机，每段送风时长服从指数分布，
+  期间以泊松过程调温/调风，温度在模式范围内均匀抽取，风速按 FAN_WEIGHTS 抽取。
+
+用法: python -m app.core.scenario_gen --rooms 2000 --minutes 1440 --out data/gen_2000.csv
+"""
+import argparse
+import csv
+import heapq
+import random
+import sys
+
+# 每小时相对权重 (0 点起)
+ARRIVAL_WEIGHTS = [0.2, 0.1, 0.1, 0.1, 0.1, 0.2, 0.4, 0.6, 0.8, 1.0, 1.2, 1.6,
+                   2.2, 3.0, 3.6, 3.4, 3.0, 2.6, 2.2, 1.8, 1.4, 1.0, 0.6, 0.4]
+USAGE_WEIGHTS = [0.6, 0.5, 0.4, 0.4, 0.4, 0.5, 0.7, 0.8, 0.6, 0.5, 0.6, 0.8,
+                 1.0, 1.2, 1.3, 1.3, 1.2, 1.1, 1.2, 1.4, 1.6, 1.6, 1.2, 0.9]
+FAN_WEIGHTS = {'LOW': 0.3, 'MID': 0.5, 'HIGH': 0.2}
+
+TEMP_RANGE = {'COOL': (18, 25), 'HEAT': (22, 28)}
+
+
+def room_ids(n, per_floor=99):
+    """101..199, 201..299, ... 形式的房间号"""
+    return [str((i // per_floor + 1) * 100 + i % per_floor + 1) for i in range(n)]
+
+
+def _weight(weights, minute, start_hour):
+    return weights[int(start_hour + minute / 60.0) % 24]
+
+
+def _poisson_times(rng, rate_per_min, weights, start_hour, begin, end):
+    """按昼夜权重对强度为 rate*weight 的非齐次泊松过程做稀疏化抽样"""
+    peak = max(weights)
+    t = begin
+    while rate_per_min > 0:
+        t += rng.expovariate(rate_per_min * peak)
+        if t >= end: return
+        if rng.random() * peak <= _weight(weights, t, start_hour):
+            yield t
+
+
+class ScenarioGenerator:
+
+    def __init__(self, rooms=1000, minutes=1440, mode='COOL', seed=0, start_hour=12,
+                 occupancy=0.6, arrivals_per_hour=None, stay_minutes=720.0,
+                 ac_sessions_per_day=4.0, ac_session_minutes=90.0, changes_per_hour=2.0):
+        self.rng = random.Random(seed)
+        self.rooms = room_ids(rooms)
+        self.minutes = minutes
+        self.mode = 'HEAT' if mode == 'HEAT' else 'COOL'
+        self.start_hour = start_hour
+        self.occupancy = occupancy
+        self.stay_minutes = stay_minutes
+        # 默认到达率使入住率大致保持在 occupancy 附近
+        if arrivals_per_hour is None:
+            arrivals_per_hour = rooms * occupancy / (stay_minutes / 60.0)
+        self.arrival_rate = arrivals_per_hour / 60.0 / (sum(ARRIVAL_WEIGHTS) / 24.0)
+        self.ac_rate = ac_sessions_per_day / 1440.0 / (sum(USAGE_WEIGHTS) / 24.0)
+        self.ac_session_minutes = ac_session_minutes
+        self.change_rate = changes_per_hour / 60.0
+        self.events = []
+
+    def _emit(self, minute, room, action, temp='', fan=''):
+        self.events.append((int(minute), room, action, temp, fan))
+
+    def _temp(self):
+        lo, hi = TEMP_RANGE[self.mode]
+        return self.rng.randint(lo, hi)
+
+    def _fan(self):
+        return self.rng.choices(list(FAN_WEIGHTS), weights=list(FAN_WEIGHTS.values()))[0]
+
+    def _stay(self, room, begin, end):
+        """一次入住：[begin, end) 之间的开关机与调节，结束时关机"""
+        rng = self.rng
+        busy_until = begin
+        for on in _poisson_times(rng, self.ac_rate, USAGE_WEIGHTS, self.start_hour, begin, end):
+            # 同一房间的开机段不重叠
+            if on < busy_until: continue
+            off = min(on + rng.expovariate(1.0 / self.ac_session_minutes), end - 1)
+            if off - on < 1: continue
+            temp, fan = self._temp(), self._fan()
+            self._emit(on, room, 'ON', temp, fan)
+            t = on
+            while True:
+                t += rng.expovariate(self.change_rate)
+                if t >= off: break
+                if rng.random() < 0.6:
+                    temp = self._temp()
+                    self._emit(t, room, 'TEMP', temp, fan)
+                else:
+                    fan = self._fan()
+                    self._emit(t, room, 'FAN', temp, fan)
+            self._emit(off, room, 'OFF', temp, fan)
+            busy_until = off + 1
+
+    def generate(self):
+        rng = self.rng
+        vacant = []
+        free_at = []
+        for room in self.rooms:
+            if rng.random() < self.occupancy:
+                out = rng.expovariate(1.0 / self.stay_minutes)
+                self._emit(0, room, 'CHECKIN')
+                self._schedule_stay(room, 0, out, free_at)
+            else:
+                vacant.append(room)
+
+        for t in _poisson_times(rng, self.arrival_rate, ARRIVAL_WEIGHTS, self.start_hour, 0, self.minutes):
+            # 归还已退房的房间
+            while free_at and free_at[0][0] <= t:
+                vacant.append(heapq.heappop(free_at)[1])
+            if not vacant: continue
+            room = vacant.pop(rng.randrange(len(vacant)))
+            self._emit(t, room, 'CHECKIN')
+            self._schedule_stay(room, t, t + rng.expovariate(1.0 / self.stay_minutes), free_at)
+
+        # 按时刻稳定排序，保持同一房间同一分钟内的动作顺序
+        self.events.sort(key=lambda e: e[0])
+        return self.events
+
+    def _schedule_stay(self, room, begin, out, free_at):
+        if out < self.minutes:
+            self._stay(room, begin + 1, out)
+            self._emit(out, room, 'CHECKOUT')
+            heapq.heappush(free_at, (out + 1, room))
+        else:
+            self._stay(room, begin + 1, self.minutes)
+
+
+def write_csv(events, f):
+    writer = csv.writer(f, lineterminator='\n')
+    for e in events:
+        writer.writerow(e)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic hotel scenario CSV')
+    parser.add_argument('--rooms', type=int, default=1000)
+    parser.add_argument('--minutes', type=int, default=1440, help='system minutes to cover')
+    parser.add_argument('--mode', default='COOL', choices=['COOL', 'HEAT'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start-hour', type=int, default=12, help='hour of day at minute 0')
+    parser.add_argument('--occupancy', type=float, default=0.6)
+    parser.add_argument('--arrivals-per-hour', type=float, default=None)
+    parser.add_argument('--stay-minutes', type=float, default=720.0)
+    parser.add_argument('--ac-sessions-per-day', type=float, default=4.0)
+    parser.add_argument('--ac-session-minutes', type=float, default=90.0)
+    parser.add_argument('--changes-per-hour', type=float, default=2.0)
+    parser.add_argument('--out', default=None, help='output path (default: stdout)')
+    args = parser.parse_args(argv)
+
+    events = ScenarioGenerator(args.rooms, args.minutes, args.mode, args.seed, args.start_hour,
+                               args.occupancy, args.arrivals_per_hour, args.stay_minutes,
+                               args.ac_sessions_per_day, args.ac_session_minutes,
+                               args.changes_per_hour).generate()
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8', newline='') as f:
+            write_csv(events, f)
+        print(f">>> [Scenario] {len(events)} events for {args.rooms} rooms -> {args.out}", file=sys.stderr)
+    else:
+        write_csv(events, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,43 @@
 from app import db
-from app.models import Room, DetailRecord, Invoice
+from app.models import Room, DetailRecord, Invoice, UsageRollup, SessionRollup
 from config import SystemConstants
 from datetime import datetime, timedelta
+from sqlalchemy import bindparam, func, or_
+from app.core.policies import RoomCandidate, create_policy, fan_priority, fan_fee_rate, fan_temp_rate
+from app.core.runtime import RoomRuntime, advance, initial_temp_for, precool_step, target_reached
+from app.services.forecast_service import ForecastService
+from app.services.report_service import ReportService
+from app.services.export_service import ExportService
+from app.core.persistence import persist
+from app.core.power import PowerMeter
+from app.core import snapshot
+from app.core.serialization import ROOM_FIELDS, RoomPayloadCache
+from app.core.profiler import PHYSICS_THREAD
+from app.core.dispatch import QueueDispatcher
+from collections import deque
+from contextlib import contextmanager
 import threading
 import time
 import uuid
 
 
-class Scheduler:
+_room = Room.__table__
+
+
+def _mode_reset_stmt(wipe):
+    """场景切换的批量房间更新；wipe 时同时清空费用与入住状态"""
+    values = dict(current_temp=bindparam('b_current_temp'), target_temp=bindparam('b_target_temp'),
+                  fan_speed='MEDIUM', power_status='OFF', active_session_id=None)
+    if wipe:
+        values.update(current_fee=0.0, total_fee=0.0, status='AVAILABLE')
+    return _room.update().where(_room.c.room_id == bindparam('b_room_id')).values(**values)
+
+
+class Scheduler(QueueDispatcher):
     _instance = None
     _lock = threading.Lock()
+    _runtime_lock = threading.Lock()
+    _start_lock = threading.Lock()
 
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
@@ -21,33 +49,62 @@ class Scheduler:
                     cls._instance.service_start_times = {}
                     cls._instance.wait_start_times = {}
                     cls._instance.temp_hysteresis_set = set()
+                    # 本次开机累计服务时长 (系统秒)，供公平类策略使用
+                    cls._instance.service_totals = {}
+                    # 预冷中的关机房间 (占用空闲服务位，不计费，任何真实请求都可以挤掉)
+                    cls._instance.precool_set = set()
+                    # 合并窗口内待生效的操作 room_id -> (首次操作时间, 生效时间, 待生效风速)
+                    cls._instance.pending_controls = {}
+                    cls._instance.power = PowerMeter()
+                    cls._instance.policy = create_policy()
+                    cls._instance.policy.attach_meter(cls._instance.power)
+                    # 房间运行时状态 (room_id -> RoomRuntime)，首次使用时从数据库加载
+                    cls._instance.rooms = {}
+                    cls._instance.room_order = []
 
                     cls._instance.current_mode = 'COOL'
                     cls._instance.is_running = False
                     cls._instance.physics_paused = True
                     cls._instance.simulation_start_time = datetime.now()
                     cls._instance.last_tick_time = datetime.now()
-                    cls._instance.start_simulation()
+                    # 房间状态版本：物理 tick 或控制操作后递增，供响应缓存判断是否过期
+                    cls._instance.state_version = 0
+                    cls._instance.payloads = RoomPayloadCache()
+                    # 最近若干次物理 tick (计算 + 持久化) 的耗时，供压测/监控读取
+                    cls._instance.tick_count = 0
+                    cls._instance.tick_ms = deque(maxlen=1024)
         return cls._instance
 
     def start_simulation(self):
-        if not self.is_running:
+        """启动物理线程 (幂等)。构造时不再自动启动，由 startSimulation 或首次合并操作触发"""
+        if self.is_running: return
+        with self._start_lock:
+            if self.is_running: return
             self.is_running = True
-            t = threading.Thread(target=self._simulation_loop, daemon=True)
+            t = threading.Thread(target=self._simulation_loop, daemon=True, name=PHYSICS_THREAD)
             t.start()
 
     def start_simulation_api(self):
+        self.start_simulation()
         now = datetime.now()
         self.simulation_start_time = now
         self.last_tick_time = now
         self.physics_paused = False
+        self.state_version += 1
         print(">>> [System] Physics Engine Started. Timebase Reset.")
 
     def stop_simulation_api(self):
         self.physics_paused = True
+        self.state_version += 1
         print(">>> [System] Physics Engine Paused.")
 
+    def get_power_status(self):
+        data = self.power.to_dict()
+        data['policy'] = self.policy.name
+        return data
+
     def get_scheduling_status(self, room_id):
+        if room_id in self.precool_set: return 'PRECOOL'
         if self.physics_paused and room_id in self.service_queue: return 'READY'
         if room_id in self.service_queue:
             return 'RUNNING'
@@ -56,13 +113,146 @@ class Scheduler:
         else:
             return 'IDLE'
 
+    def get_room_payload(self, room_id, fields=ROOM_FIELDS):
+        with db.app.app_context():
+            self._ensure_runtime()
+        return self.payloads.room(self, room_id, fields)
+
+    def get_rooms_payload(self, fields=ROOM_FIELDS, fmt='rows', room_ids=None):
+        """批量房间状态响应体 (已编码的 bytes)"""
+        with db.app.app_context():
+            self._ensure_runtime()
+        return self.payloads.encoded_rooms(self, fields, fmt, room_ids)
+
+    # ================= 运行时状态 =================
+
+    def _ensure_runtime(self):
+        if not self.rooms:
+            self._load_runtime()
+
+    def _load_runtime(self):
+        """从数据库整体加载房间运行时状态 (需要 app context)"""
+        with self._runtime_lock:
+            rooms = {}
+            for room in Room.query.order_by(Room.room_id).all():
+                rooms[room.room_id] = RoomRuntime.from_orm(room, self.current_mode)
+
+            open_records = DetailRecord.query.filter_by(end_time=None) \
+                .order_by(DetailRecord.record_id).all()
+            for record in open_records:
+                rt = rooms.get(record.room_id)
+                if rt: rt.attach_record(record)
+
+            self.rooms = rooms
+            self.room_order = list(rooms)
+            self.state_version += 1
+
+    def sync_room(self, room_id):
+        """房间被调度器以外的代码修改后 (如退房)，重新加载其运行时状态"""
+        self.sync_rooms([room_id])
+
+    def sync_rooms(self, room_ids):
+        """批量版 sync_room (团队入住/退房)：一次查询加载，队列调整后只重新调度一次"""
+        with self._lock:
+            self._sync_rooms(room_ids)
+        # 队列调整完成后再使响应缓存失效，避免轮询在中间状态缓存过期的 sched_status
+        self.state_version += 1
+
+    def _sync_rooms(self, room_ids):
+        """调用方持有 _lock"""
+        with db.app.app_context():
+            self._ensure_runtime()
+            rooms = Room.query.filter(Room.room_id.in_(list(room_ids))).all()
+            loaded = []
+            for room in rooms:
+                rt = self.rooms.get(room.room_id)
+                if not rt: continue
+                rt.load(room)
+                loaded.append(rt)
+
+            for rt in loaded:
+                if rt.status != 'OCCUPIED':
+                    self._stop_precool(rt.room_id)
+            off = [rt.room_id for rt in loaded if rt.power_status == 'OFF']
+            if not off: return
+            for room_id in off:
+                self._release_room(room_id)
+            try:
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Sync Err: {e}")
+            self._schedule_next()
+
+    def _release_room(self, room_id):
+        """房间关机后移出调度 (不提交)：详单按运行时费用结算"""
+        self.pending_controls.pop(room_id, None)
+        self._remove_from_service(room_id, commit=False)
+        self._remove_from_wait(room_id)
+        self.temp_hysteresis_set.discard(room_id)
+        self.service_totals.pop(room_id, None)
+
+    @contextmanager
+    def checking_out(self, room_ids):
+        """
+        退房：持有 _lock 先把房间关机并结算详单、写回运行时费用，调用方在 with 块内开票并提交退房，
+        退出时重新加载这些房间。整个过程物理 tick 不会继续计费，也不会把旧的 current_fee 写回。
+        调用方应在 with 块内才开始查询，以便读到此处提交的结算结果。
+        """
+        room_ids = list(room_ids)
+        with self._lock:
+            with db.app.app_context():
+                try:
+                    self._ensure_runtime()
+                    for room_id in room_ids:
+                        self._stop_precool(room_id)
+                        self._release_room(room_id)
+                        # 不在服务队列中的房间也可能留有未结束的详单
+                        self._close_current_record(room_id, commit=False)
+                        rt = self.rooms.get(room_id)
+                        if rt:
+                            rt.power_status = 'OFF'
+                            rt.active_session_id = None
+                    self._persist_runtime()
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Checkout Release Err: {e}")
+            try:
+                yield
+            finally:
+                self._sync_rooms(room_ids)
+        self.state_version += 1
+
     # ================= 接口方法 =================
 
-    def request_power(self, room_id, fan_speed, target_temp):
+    def request_power(self, room_id, fan_speed=None, target_temp=None):
+        """
+        开机/调温/调风。fan_speed、target_temp 为 None 表示沿用当前设置。
+        已开机房间的连续操作在合并窗口内只生效一次 (见 _coalesce_control)。
+        """
+        with db.app.app_context():
+            self._ensure_runtime()
+        rt = self.rooms.get(room_id)
+        if not rt: return False
+
+        if fan_speed is None:
+            pending = self.pending_controls.get(room_id)
+            fan_speed = pending[2] if pending else rt.fan_speed
+        if target_temp is None: target_temp = rt.target_temp
+
+        window = self._coalesce_window(room_id)
+        if window > 0 and rt.power_status == 'ON':
+            return self._coalesce_control(rt, fan_speed, target_temp, window)
+        return self._apply_power(room_id, fan_speed, target_temp)
+
+    def _apply_power(self, room_id, fan_speed, target_temp):
         with db.app.app_context():
             try:
+                self._ensure_runtime()
                 room = Room.query.get(room_id)
-                if not room: return False
+                rt = self.rooms.get(room_id)
+                if not room or not rt: return False
 
                 self._close_current_record(room.room_id)
 
@@ -77,8 +267,15 @@ class Scheduler:
 
                 if room.room_id in self.temp_hysteresis_set:
                     self.temp_hysteresis_set.remove(room.room_id)
+                self._stop_precool(room.room_id)
 
                 db.session.commit()
+
+                rt.target_temp = float(target_temp)
+                rt.fan_speed = clean_fan
+                rt.power_status = 'ON'
+                rt.fee_rate = self._get_fee_rate(clean_fan)
+                rt.active_session_id = room.active_session_id
             except Exception as e:
                 db.session.rollback()
                 print(f"DB Error R{room_id}: {e}")
@@ -86,178 +283,118 @@ class Scheduler:
 
         with self._lock:
             with db.app.app_context():
-                room = Room.query.get(room_id)
-                if not self._needs_service(room):
-                    self.temp_hysteresis_set.add(room.room_id)
+                if not self._needs_service(rt):
+                    self.temp_hysteresis_set.add(room_id)
                     self._remove_from_service(room_id)
                     self._remove_from_wait(room_id)
                 else:
-                    self._handle_scheduling(room.room_id)
+                    self._handle_scheduling(room_id)
+        self.state_version += 1
         return True
 
     def stop_power(self, room_id):
+        with self._lock:
+            self.pending_controls.pop(room_id, None)
         with db.app.app_context():
             try:
+                self._ensure_runtime()
                 self._close_current_record(room_id)
                 room = Room.query.get(room_id)
                 if room:
                     room.power_status = 'OFF'
                     room.active_session_id = None
                     db.session.commit()
+                rt = self.rooms.get(room_id)
+                if rt:
+                    rt.power_status = 'OFF'
+                    rt.active_session_id = None
             except Exception as e:
                 print(f"DB Error Stop R{room_id}: {e}")
 
         with self._lock:
-            self._remove_from_service(room_id)
-            self._remove_from_wait(room_id)
-            if room_id in self.temp_hysteresis_set:
-                self.temp_hysteresis_set.remove(room_id)
-            self._schedule_next()
+            with db.app.app_context():
+                self._remove_from_service(room_id)
+                self._remove_from_wait(room_id)
+                if room_id in self.temp_hysteresis_set:
+                    self.temp_hysteresis_set.remove(room_id)
+                self.service_totals.pop(room_id, None)
+                self._schedule_next()
+        self.state_version += 1
         return True
 
-    # ================= 调度核心 =================
+    # ================= 操作合并 =================
 
-    def _handle_scheduling(self, room_id):
-        room = Room.query.get(room_id)
-        if not room: return
+    def _coalesce_window(self, room_id):
+        return SystemConstants.CONTROL_COALESCE_ROOMS.get(str(room_id), SystemConstants.CONTROL_COALESCE_SEC)
 
-        old_svc_time = self.service_start_times.get(room_id)
-
-        self._remove_from_service(room_id)
-        self._remove_from_wait(room_id)
-
-        if len(self.service_queue) < SystemConstants.MAX_SERVICE:
-            self._add_to_service(room, original_start_time=old_svc_time)
-            return
-
-        req_prio = self._get_priority(room.fan_speed)
-        lowest_prio_val = 999
-        candidates = []
+    def _coalesce_control(self, rt, fan_speed, target_temp, window):
+        """
+        目标温度立即生效；风速在窗口结束时才切换，窗口内物理、计费和机组负荷
+        都保持当前详单的风速，保证详单费用与其风速/费率一致。
+        关闭/新建详单、写库和重新调度推迟到窗口结束时合并为一次。
+        """
+        clean_fan = str(fan_speed).strip().upper()
+        with self._lock:
+            rt.target_temp = float(target_temp)
+
+            now = time.time()
+            first = self.pending_controls[rt.room_id][0] if rt.room_id in self.pending_controls else now
+            deadline = min(now + window, first + SystemConstants.CONTROL_COALESCE_MAX_SEC)
+            self.pending_controls[rt.room_id] = (first, deadline, clean_fan)
+        self.state_version += 1
+        # 待生效操作由物理线程刷新
+        self.start_simulation()
+        return True
 
-        for rid in self.service_queue:
-            r_srv = Room.query.get(rid)
-            if not r_srv: continue
-
-            p = self._get_priority(r_srv.fan_speed)
-            d = self._get_service_duration(rid)
-
-            if p < lowest_prio_val:
-                lowest_prio_val = p
-                candidates = [(rid, p, d)]
-            elif p == lowest_prio_val:
-                candidates.append((rid, p, d))
-
-        if req_prio > lowest_prio_val:
-            candidates.sort(key=lambda x: x[2], reverse=True)
-            target_to_kick = candidates[0][0]
-            print(f">>> [Preempt] R{room_id} kicks R{target_to_kick}")
-            r_kicked = Room.query.get(target_to_kick)
-            self._move_to_wait(r_kicked)
-            self._add_to_service(room, original_start_time=old_svc_time)
-            return
+    def _flush_pending_controls(self, force=False):
+        if not self.pending_controls: return
+        now = time.time()
+        with self._lock:
+            due = [(rid, p[2]) for rid, p in self.pending_controls.items() if force or p[1] <= now]
+            for rid, _ in due:
+                self.pending_controls.pop(rid, None)
 
-        self._add_to_wait(room)
+        for rid, fan in due:
+            rt = self.rooms.get(rid)
+            if not rt or rt.power_status != 'ON': continue
+            try:
+                self._apply_power(rid, fan, rt.target_temp)
+            except Exception as e:
+                print(f"Control Flush Err R{rid}: {e}")
 
-    def _schedule_next(self):
-        if len(self.wait_queue) == 0: return
-        if len(self.service_queue) >= SystemConstants.MAX_SERVICE: return
+    # ================= 调度核心 (决策流程见 QueueDispatcher) =================
 
-        with db.app.app_context():
-            candidates = []
-            for rid in list(self.wait_queue):
-                r = Room.query.get(rid)
-                if not r or not self._needs_service(r):
-                    self.wait_queue.remove(rid)
-                    continue
-                p = self._get_priority(r.fan_speed)
-                t = self.wait_start_times.get(rid, datetime.now())
-                candidates.append({'rid': rid, 'prio': p, 'time': t, 'room': r})
-
-            candidates.sort(key=lambda x: (-x['prio'], x['time']))
-
-            if candidates:
-                best = candidates[0]
-                print(f">>> [Fill Slot] R{best['rid']} starts service")
-                self._move_to_service(best['room'])
-
-    def _check_dynamic_preemption(self):
-        if not self.wait_queue: return
+    def _log(self, msg):
+        print(msg)
 
-        with db.app.app_context():
-            min_serv = None
-            for rid in self.service_queue:
-                r = Room.query.get(rid)
-                if not r: continue
-                p = self._get_priority(r.fan_speed)
-                d = self._get_service_duration(rid)
-
-                if min_serv is None or p < min_serv['prio']:
-                    min_serv = {'rid': rid, 'prio': p, 'dur': d}
-                elif p == min_serv['prio'] and d > min_serv['dur']:
-                    min_serv = {'rid': rid, 'prio': p, 'dur': d}
-
-            if not min_serv: return
-
-            max_wait = None
-            for rid in self.wait_queue:
-                r = Room.query.get(rid)
-                if not r or not self._needs_service(r): continue
-                p = self._get_priority(r.fan_speed)
-
-                if max_wait is None or p > max_wait['prio']:
-                    max_wait = {'rid': rid, 'prio': p}
-
-            if not max_wait: return
-
-            if max_wait['prio'] > min_serv['prio']:
-                print(f">>> [Dynamic Swap] R{max_wait['rid']} replaces R{min_serv['rid']}")
-                r_w = Room.query.get(max_wait['rid'])
-                r_s = Room.query.get(min_serv['rid'])
-                self._move_to_wait(r_s)
-                self._move_to_service(r_w)
-
-    def _tick_time_slice_check(self):
-        now = datetime.now()
-        with db.app.app_context():
-            for wid in list(self.wait_queue):
-                st = self.wait_start_times.get(wid)
-                if not st: continue
-
-                dur = (now - st).total_seconds() * SystemConstants.TIME_KX
-                if dur >= SystemConstants.TIME_SLICE:
-                    wroom = Room.query.get(wid)
-                    if not wroom: continue
-                    wprio = self._get_priority(wroom.fan_speed)
-
-                    target_sid = None
-                    max_d = -1
-
-                    for sid in self.service_queue:
-                        sroom = Room.query.get(sid)
-                        if not sroom: continue
-                        sprio = self._get_priority(sroom.fan_speed)
-
-                        if sprio == wprio:
-                            d = self._get_service_duration(sid)
-                            if d > max_d:
-                                max_d = d
-                                target_sid = sid
-
-                    if target_sid:
-                        print(f">>> [RR Slice] R{wid} rotates R{target_sid}")
-                        r_wait = Room.query.get(wid)
-                        r_serv = Room.query.get(target_sid)
-                        self._move_to_wait(r_serv)
-                        self._move_to_service(r_wait)
-                        return
-
-                        # ================= 物理循环 (优化版) =================
+    def _make_candidate(self, room):
+        rid = room.room_id
+        if self.current_mode == 'COOL':
+            delta = room.current_temp - room.target_temp
+        else:
+            delta = room.target_temp - room.current_temp
+        waited = 0.0
+        if rid in self.wait_start_times:
+            waited = (datetime.now() - self.wait_start_times[rid]).total_seconds() * SystemConstants.TIME_KX
+        return RoomCandidate(
+            rid, room.fan_speed, delta=max(delta, 0.0),
+            served=self._get_service_duration(rid) * SystemConstants.TIME_KX,
+            waited=waited,
+            served_total=self.service_totals.get(rid, 0.0)
+        )
+
+    # ================= 物理循环 (优化版) =================
 
     def _simulation_loop(self):
         # 优化 1: 增加间隔至 0.5s，降低 DB 竞争频率
         step_real_sec = 0.5
 
         while self.is_running:
+            try:
+                self._flush_pending_controls()
+            except Exception as e:
+                print(f"Control Flush Err: {e}")
+
             if self.physics_paused:
                 time.sleep(1)
                 self.last_tick_time = datetime.now()
@@ -274,7 +411,10 @@ class Scheduler:
                         if actual_delta > 5.0: actual_delta = 5.0
 
                         delta_sys_sec = actual_delta * SystemConstants.TIME_KX
+                        started = time.perf_counter()
                         self._update_all_physics(delta_sys_sec)
+                        self.tick_ms.append((time.perf_counter() - started) * 1000.0)
+                        self.tick_count += 1
                 except Exception as e:
                     print(f"Phys Loop Err: {e}")
 
@@ -285,93 +425,118 @@ class Scheduler:
                     with self._lock:
                         self._tick_time_slice_check()
                         self._check_dynamic_preemption()
+                        if SystemConstants.PRECOOL_ENABLED:
+                            self._check_precool()
                 except Exception as e:
-                    pass
+                    print(f"Sched Loop Err: {e}")
+            self.state_version += 1
 
             time.sleep(step_real_sec)
 
     def _update_all_physics(self, delta_sys_sec):
-        # 优化 3: 强制按 ID 排序更新，防止死锁 (Deadlock Prevention)
-        rooms = Room.query.order_by(Room.room_id).all()
-        for room in rooms:
-            self._update_single_room(room, delta_sys_sec)
-        db.session.commit()
+        # 优化 3: 物理计算只作用于运行时对象，ORM 仅在持久化时出现
+        self._ensure_runtime()
+        # 持锁推进与写回，退房结算期间不会继续计费或写回过期的费用
+        with self._lock:
+            for rid in self.room_order:
+                self._update_single_room(self.rooms[rid], delta_sys_sec)
+            self.power.integrate(delta_sys_sec)
+            self._persist_runtime()
 
-    def _update_single_room(self, room, delta_sys_sec):
-        is_serving = (room.room_id in self.service_queue) and (room.power_status == 'ON')
-        current_temp = float(room.current_temp)
-        target_temp = float(room.target_temp)
+    def _persist_runtime(self):
+        """调用方持有 _lock"""
+        dirty = [rt for rt in self.rooms.values() if rt.dirty]
+        if not dirty: return
 
         try:
-            key = int(room.room_id)
-            if self.current_mode == 'COOL':
-                initial_temp = SystemConstants.COOL_MODE_DEFAULTS['initial_temps'][key]
-            else:
-                initial_temp = SystemConstants.HEAT_MODE_DEFAULTS['initial_temps'][key]
-        except:
-            initial_temp = 25.0
+            persist(db.session, dirty, SystemConstants.PERSIST_MODE)
+            db.session.commit()
+            for rt in dirty:
+                rt.dirty = False
+        except Exception as e:
+            db.session.rollback()
+            print(f"Persist Err: {e}")
+
+    def _update_single_room(self, room, delta_sys_sec):
+        """调用方持有 _lock"""
+        rid = room.room_id
+        is_serving = (rid in self.service_start_times) and (room.power_status == 'ON')
+
+        if rid in self.precool_set and room.power_status == 'OFF':
+            if precool_step(room, self.current_mode, delta_sys_sec, self._precool_target()):
+                print(f">>> [Precool] R{rid} ready.")
+                self._stop_precool(rid)
+            return
+
+        effective_time_sec = advance(room, self.current_mode, delta_sys_sec, is_serving)
 
         if is_serving:
-            clean_fan = str(room.fan_speed).strip().upper()
-            rate = self._get_temp_change_rate(clean_fan)
-            temp_delta = (rate / 60.0) * delta_sys_sec
-            effective_time_sec = delta_sys_sec
+            self.service_totals[rid] = self.service_totals.get(rid, 0.0) + effective_time_sec
 
-            if self.current_mode == 'COOL':
-                if (current_temp - temp_delta) < target_temp:
-                    needed = current_temp - target_temp
-                    if needed < 0: needed = 0
-                    if rate > 0: effective_time_sec = needed / (rate / 60.0)
-                    new_temp = target_temp
-                else:
-                    new_temp = current_temp - temp_delta
-            else:
-                if (current_temp + temp_delta) > target_temp:
-                    needed = target_temp - current_temp
-                    if needed < 0: needed = 0
-                    if rate > 0: effective_time_sec = needed / (rate / 60.0)
-                    new_temp = target_temp
-                else:
-                    new_temp = current_temp + temp_delta
+            if target_reached(room, self.current_mode):
+                print(f">>> [Reached] R{rid} temp target reached.")
+                self.temp_hysteresis_set.add(rid)
+                self._remove_from_service(rid)
+                self._schedule_next()
 
-            fee_rate_per_min = self._get_fee_rate(clean_fan)
-            cost = (fee_rate_per_min / 60.0) * effective_time_sec
+        if room.power_status == 'ON' and rid not in self.service_start_times and \
+                rid not in self.wait_start_times:
+            self._check_idle_room(room)
 
-            room.current_fee = float(room.current_fee) + cost
-            room.total_fee = float(room.total_fee) + cost
+    # ================= 预冷模式 =================
 
-            record = DetailRecord.query.filter_by(room_id=room.room_id, end_time=None).first()
-            if record:
-                record.fee = float(record.fee) + cost
-                record.duration = float(record.duration) + effective_time_sec
-        else:
-            step = (SystemConstants.RECOVER_RATE / 60.0) * delta_sys_sec
-            if self.current_mode == 'COOL':
-                new_temp = current_temp + step
-                if new_temp > initial_temp: new_temp = initial_temp
-            else:
-                new_temp = current_temp - step
-                if new_temp < initial_temp: new_temp = initial_temp
+    def _check_precool(self):
+        """没有房间等待时，用空闲服务位预冷预测即将用空调的在住关机房间"""
+        if self.wait_queue: return
+        if self.policy.over_capacity(len(self.service_queue) + len(self.precool_set) + 1): return
 
-        room.current_temp = round(new_temp, 4)
+        at = datetime.now() + timedelta(minutes=SystemConstants.PRECOOL_LEAD_MINUTES)
+        demand = ForecastService.predicted_demand(at)
+        target = self._precool_target()
 
-        if is_serving:
-            reached = False
-            if self.current_mode == 'COOL' and room.current_temp <= (target_temp + 0.001): reached = True
-            if self.current_mode == 'HEAT' and room.current_temp >= (target_temp - 0.001): reached = True
-
-            if reached:
-                print(f">>> [Reached] R{room.room_id} temp target reached.")
-                self.temp_hysteresis_set.add(room.room_id)
-                with self._lock:
-                    self._remove_from_service(room.room_id)
-                    self._schedule_next()
-
-        if room.power_status == 'ON' and room.room_id not in self.service_queue and \
-                room.room_id not in self.wait_queue:
-            if self._needs_service(room):
-                with self._lock:
-                    self._handle_scheduling(room.room_id)
+        candidates = []
+        for rid, d in demand.items():
+            if d < SystemConstants.PRECOOL_MIN_DEMAND or rid in self.precool_set: continue
+            rt = self.rooms.get(rid)
+            if not rt or rt.power_status != 'OFF' or rt.status != 'OCCUPIED': continue
+            gap = rt.current_temp - target if self.current_mode == 'COOL' else target - rt.current_temp
+            if gap <= 0: continue
+            candidates.append((d, rid))
+
+        candidates.sort(reverse=True)
+        for d, rid in candidates:
+            self._start_precool(rid)
+            if self.policy.over_capacity(len(self.service_queue) + len(self.precool_set)):
+                self._stop_precool(rid)
+                break
+            print(f">>> [Precool] R{rid} (predicted {d:.0f}s)")
+
+    def _start_precool(self, room_id):
+        self.precool_set.add(room_id)
+        self.power.admit(room_id, 'LOW')
+
+    def _stop_precool(self, room_id):
+        if room_id in self.precool_set:
+            self.precool_set.discard(room_id)
+            self.power.release(room_id)
+
+    def _free_reserved(self):
+        """预冷借用的功率让给真正请求送风的房间"""
+        if not self.precool_set: return False
+        rid = next(iter(self.precool_set))
+        print(f">>> [Precool] R{rid} yields to demand.")
+        self._stop_precool(rid)
+        return True
+
+    def _trim_precool(self):
+        while self.precool_set and \
+                self.policy.over_capacity(len(self.service_queue) + len(self.precool_set)):
+            self._stop_precool(next(iter(self.precool_set)))
+
+    def _precool_target(self):
+        if self.current_mode == 'HEAT':
+            return SystemConstants.HEAT_MODE_DEFAULTS['default_target']
+        return SystemConstants.COOL_MODE_DEFAULTS['default_target']
 
     # ================= 工具方法 =================
 
@@ -399,6 +564,8 @@ class Scheduler:
     def _add_to_service(self, room, original_start_time=None):
         if room.room_id not in self.service_queue:
             self.service_queue.append(room.room_id)
+            self.power.admit(room.room_id, room.fan_speed)
+            self._trim_precool()
             if original_start_time:
                 self.service_start_times[room.room_id] = original_start_time
             else:
@@ -417,103 +584,300 @@ class Scheduler:
             )
             db.session.add(new_record)
             db.session.commit()
+            room.attach_record(new_record)
         except Exception as e:
             db.session.rollback()
 
-    def _close_current_record(self, room_id):
+    def _close_current_record(self, room_id, commit=True):
+        rt = self.rooms.get(room_id)
+        if rt is None or rt.record_id is None: return
         try:
+            # 结算时带上运行时累计的费用/时长，保证详单精确
             records = DetailRecord.query.filter_by(room_id=room_id, end_time=None).all()
             for r in records:
+                if r.record_id == rt.record_id:
+                    rt.apply_record_to(r)
                 r.end_time = datetime.now()
                 db.session.add(r)
-            db.session.commit()
+                # 与详单结束同一事务更新报表汇总；放在 savepoint 中，汇总失败 (如旧库缺少汇总表)
+                # 不影响详单结算，报表可用 python -m app.services.report_service rebuild 重建
+                try:
+                    with db.session.begin_nested():
+                        ReportService.add_to_rollup(r)
+                except Exception as e:
+                    print(f"Rollup Err R{room_id}: {e}")
+            if commit: db.session.commit()
+            rt.detach_record()
         except Exception as e:
             db.session.rollback()
+            print(f"Close Record Err R{room_id}: {e}")
 
     def _add_to_wait(self, room):
         if room.room_id not in self.wait_queue:
             self.wait_queue.append(room.room_id)
             self.wait_start_times[room.room_id] = datetime.now()
 
-    def _remove_from_service(self, room_id):
+    def _remove_from_service(self, room_id, commit=True):
         if room_id in self.service_queue:
             self.service_queue.remove(room_id)
             self.service_start_times.pop(room_id, None)
-            self._close_current_record(room_id)
+            self.power.release(room_id)
+            self._close_current_record(room_id, commit)
 
     def _remove_from_wait(self, room_id):
         if room_id in self.wait_queue:
             self.wait_queue.remove(room_id)
             self.wait_start_times.pop(room_id, None)
 
-    def _move_to_wait(self, room):
-        self._remove_from_service(room.room_id)
-        self._add_to_wait(room)
-
-    def _move_to_service(self, room):
-        self._remove_from_wait(room.room_id)
-        self._add_to_service(room)
-
     def _get_service_duration(self, room_id):
         start = self.service_start_times.get(room_id)
         if not start: return 0
         return (datetime.now() - start).total_seconds()
 
     def _get_priority(self, fan):
-        f = str(fan).strip().upper()
-        if f == 'HIGH': return 3
-        if f in ['MEDIUM', 'MID']: return 2
-        return 1
+        return fan_priority(fan)
 
     def _get_fee_rate(self, fan):
-        if not fan: return 0.5
-        f = str(fan).strip().upper()
-        if f == 'HIGH': return float(SystemConstants.FEE_RATE_HIGH)
-        if f in ['MEDIUM', 'MID']: return float(SystemConstants.FEE_RATE_MID)
-        if f == 'LOW': return float(SystemConstants.FEE_RATE_LOW)
-        return 0.5
+        return fan_fee_rate(fan)
 
     def _get_temp_change_rate(self, fan):
-        f = str(fan).strip().upper()
-        if f == 'HIGH': return SystemConstants.TEMP_XH_HIGH
-        if f in ['MEDIUM', 'MID']: return SystemConstants.TEMP_XH_MID
-        if f == 'LOW': return SystemConstants.TEMP_XH_LOW
-        return 0.5
+        return fan_temp_rate(fan)
+
+    def reset_mode(self, mode, wipe=False):
+        """
+        切换制冷/制热场景：结束所有送风 (未结束详单正常结算并计入汇总)，把配置中的房间批量重置为
+        该模式的初始温度、默认目标温度、中风、关机。详单、账单、入住状态和累计费用都保留。
+        wipe=True 时回到干净的演示环境：有该模式的基线快照则恢复 (回滚基线之后的详单/账单)，
+        基线与当前模式配置或房间不一致时抛出 ValueError；没有基线则清空详单/账单并保存为基线。
+        """
+        mode = 'HEAT' if mode == 'HEAT' else 'COOL'
+        baseline = f"baseline-{mode}"
+        if wipe and snapshot.exists(baseline):
+            self._check_baseline(baseline, mode)
+            if not self.restore_snapshot(baseline): return False
+            print(f">>> [System] {baseline} restored.")
+            return True
 
-    def reset_mode(self, mode):
+        self.physics_paused = True
         with db.app.app_context():
-            if mode == 'HEAT':
-                self.current_mode = 'HEAT'
-                config = SystemConstants.HEAT_MODE_DEFAULTS
-            else:
-                self.current_mode = 'COOL'
-                config = SystemConstants.COOL_MODE_DEFAULTS
-
+            self._ensure_runtime()
             with self._lock:
+                self.pending_controls.clear()
+                try:
+                    if wipe:
+                        db.session.query(DetailRecord).delete()
+                        db.session.query(Invoice).delete()
+                        db.session.query(UsageRollup).delete()
+                        db.session.query(SessionRollup).delete()
+                    else:
+                        # 先落库 tick 累计的费用，再按正常关机结算所有未结束详单
+                        self._persist_runtime()
+                        for rid in list(self.service_queue):
+                            self._remove_from_service(rid, commit=False)
+                        for rt in self.rooms.values():
+                            if rt.record_id is not None:
+                                self._close_current_record(rt.room_id, commit=False)
+
+                    self.current_mode = mode
+                    params = self._mode_reset_params(mode)
+                    if params:
+                        db.session.execute(_mode_reset_stmt(wipe), params)
+                    db.session.commit()
+                    # 详单/账单已清空，缓存的导出结果不再对应任何数据
+                    if wipe: ExportService.clear_cache()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Reset Err {mode}: {e}")
+                    return False
+
                 self.service_queue.clear()
                 self.wait_queue.clear()
                 self.service_start_times.clear()
                 self.wait_start_times.clear()
                 self.temp_hysteresis_set.clear()
+                self.service_totals.clear()
+                self.precool_set.clear()
+                self.power.reset()
+            self._load_runtime()
 
-            self.physics_paused = True
+        if wipe: self.capture_snapshot(baseline)
+        return True
 
-            db.session.query(DetailRecord).delete()
-            db.session.query(Invoice).delete()
-            rooms = Room.query.all()
-            for room in rooms:
-                str_id = str(room.room_id)
-                int_id = int(room.room_id)
-                val = config['initial_temps'].get(int_id) or config['initial_temps'].get(str_id)
-
-                if val is not None:
-                    room.current_temp = val
-                    room.target_temp = config['default_target']
-                    room.fan_speed = 'MEDIUM'
-                    room.power_status = 'OFF'
-                    room.current_fee = 0.0
-                    room.total_fee = 0.0
-                    room.status = 'AVAILABLE'
-                    room.active_session_id = None
-            db.session.commit()
-        return True
\ No newline at end of file
+    def _mode_initial_temps(self, mode):
+        """该模式配置了初始温度的房间 {room_id: 初始温度}"""
+        temps = (SystemConstants.HEAT_MODE_DEFAULTS if mode == 'HEAT' else SystemConstants.COOL_MODE_DEFAULTS)['initial_temps']
+        result = {}
+        for rid in self.room_order:
+            val = temps.get(str(rid))
+            if val is None and str(rid).isdigit(): val = temps.get(int(rid))
+            if val is not None: result[rid] = float(val)
+        return result
+
+    def _mode_reset_params(self, mode):
+        config = SystemConstants.HEAT_MODE_DEFAULTS if mode == 'HEAT' else SystemConstants.COOL_MODE_DEFAULTS
+        return [{'b_room_id': rid, 'b_current_temp': val, 'b_target_temp': config['default_target']}
+                for rid, val in self._mode_initial_temps(mode).items()]
+
+    def _scenario(self, mode):
+        """快照对应的场景配置，wipe 恢复基线前用来确认基线没有过期"""
+        config = SystemConstants.HEAT_MODE_DEFAULTS if mode == 'HEAT' else SystemConstants.COOL_MODE_DEFAULTS
+        return {'mode': mode, 'default_target': float(config['default_target']),
+                'rooms': sorted(self.room_order), 'initial_temps': self._mode_initial_temps(mode)}
+
+    def _check_baseline(self, name, mode):
+        with db.app.app_context():
+            self._ensure_runtime()
+        data = snapshot.load(name) or {}
+        if data.get('scenario') != self._scenario(mode):
+            raise ValueError(f"Snapshot {name} does not match the current {mode} config or rooms; "
+                             f"delete {name}.json.gz from SNAPSHOT_DIR to rebuild it")
+
+    # ================= 快照 =================
+
+    def capture_snapshot(self, name):
+        """把房间、队列、计时、未结束详单和账目高水位保存为命名快照"""
+        self._flush_pending_controls(force=True)
+        now = datetime.now()
+
+        with self._lock:
+            with db.app.app_context():
+                self._ensure_runtime()
+                # 先把运行时状态落库，保证快照与数据库一致
+                self._persist_runtime()
+
+                rooms = [[rt.room_id, rt.current_temp, rt.target_temp, rt.fan_speed, rt.power_status,
+                          rt.fee_rate, rt.current_fee, rt.total_fee, rt.active_session_id,
+                          rt.customer_id, rt.status] for rt in self.rooms.values()]
+
+                open_rt = {rt.record_id: rt for rt in self.rooms.values() if rt.record_id is not None}
+                open_records = []
+                if open_rt:
+                    for r in DetailRecord.query.filter(DetailRecord.record_id.in_(list(open_rt))).all():
+                        rt = open_rt[r.record_id]
+                        open_records.append({
+                            'record_id': r.record_id, 'room_id': r.room_id, 'session_id': r.session_id,
+                            'start_time': r.start_time.isoformat(), 'fan_speed': r.fan_speed,
+                            'fee_rate': float(r.fee_rate), 'fee': rt.record_fee, 'duration': rt.record_duration
+                        })
+
+                record_mark = db.session.query(func.max(DetailRecord.record_id)).scalar() or 0
+
+            def ago(times):
+                return {rid: (now - t).total_seconds() for rid, t in times.items()}
+
+            data = {
+                'name': name,
+                'captured_at': now.isoformat(),
+                'mode': self.current_mode,
+                'record_mark': record_mark,
+                'room_fields': snapshot.ROOM_FIELDS,
+                'rooms': rooms,
+                'open_records': open_records,
+                'service_queue': list(self.service_queue),
+                'wait_queue': list(self.wait_queue),
+                'service_ago': ago(self.service_start_times),
+                'wait_ago': ago(self.wait_start_times),
+                'hysteresis': sorted(self.temp_hysteresis_set),
+                'service_totals': dict(self.service_totals),
+                'precool': sorted(self.precool_set),
+                'energy_kwh': self.power.energy_kwh,
+                'sim_elapsed': (now - self.simulation_start_time).total_seconds(),
+                'scenario': self._scenario(self.current_mode)
+            }
+
+        snapshot.save(name, data)
+        print(f">>> [Snapshot] {name} captured ({len(rooms)} rooms).")
+        return True
+
+    def restore_snapshot(self, name):
+        """
+        恢复命名快照：删除快照之后新增的详单/账单并撤销其报表累计，
+        重建快照时未结束的详单，批量写回房间，最后替换内存中的队列与运行时状态。
+        恢复后物理引擎处于暂停状态。
+        """
+        data = snapshot.load(name)
+        if not data: return False
+
+        self.physics_paused = True
+        captured_at = datetime.fromisoformat(data['captured_at'])
+        mark = data['record_mark']
+        open_ids = [r['record_id'] for r in data['open_records']]
+
+        with self._lock:
+            self.pending_controls.clear()
+            with db.app.app_context():
+                try:
+                    changed = or_(DetailRecord.record_id > mark, DetailRecord.record_id.in_(open_ids))
+                    since = ReportService.remove_from_rollup(changed)
+                    DetailRecord.query.filter(changed).delete(synchronize_session=False)
+                    if since: ReportService.prune_session_rollup(since)
+                    Invoice.query.filter(Invoice.create_time > captured_at).delete(synchronize_session=False)
+
+                    if data['open_records']:
+                        rows = []
+                        for r in data['open_records']:
+                            row = dict(r)
+                            row['start_time'] = datetime.fromisoformat(r['start_time'])
+                            row['end_time'] = None
+                            rows.append(row)
+                        db.session.execute(DetailRecord.__table__.insert(), rows)
+
+                    if data['rooms']:
+                        db.session.execute(snapshot.ROOM_RESTORE, snapshot.room_restore_params(data['rooms']))
+                    db.session.commit()
+                    # 回滚的详单/账单号可能被复用，已缓存的导出按旧内容命中
+                    ExportService.clear_cache()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Snapshot Restore Err {name}: {e}")
+                    return False
+
+            self._restore_memory(data)
+        print(f">>> [Snapshot] {name} restored.")
+        return True
+
+    def _restore_memory(self, data):
+        now = datetime.now()
+        self.current_mode = data['mode']
+
+        rooms = {}
+        for row in data['rooms']:
+            f = dict(zip(data['room_fields'], row))
+            rt = RoomRuntime(f['room_id'], current_temp=f['current_temp'], target_temp=f['target_temp'],
+                             initial_temp=initial_temp_for(self.current_mode, f['room_id']),
+                             fan_speed=f['fan_speed'], power_status=f['power_status'],
+                             current_fee=f['current_fee'], total_fee=f['total_fee'],
+                             active_session_id=f['active_session_id'])
+            rt.fee_rate = f['fee_rate']
+            rt.customer_id = f['customer_id']
+            rt.status = f['status']
+            rooms[rt.room_id] = rt
+        for r in data['open_records']:
+            rt = rooms.get(r['room_id'])
+            if rt:
+                rt.record_id = r['record_id']
+                rt.record_fee = r['fee']
+                rt.record_duration = r['duration']
+
+        with self._runtime_lock:
+            self.rooms = rooms
+            self.room_order = sorted(rooms)
+
+        self.service_queue[:] = data['service_queue']
+        self.wait_queue[:] = data['wait_queue']
+        self.service_start_times = {rid: now - timedelta(seconds=s) for rid, s in data['service_ago'].items()}
+        self.wait_start_times = {rid: now - timedelta(seconds=s) for rid, s in data['wait_ago'].items()}
+        self.temp_hysteresis_set = set(data['hysteresis'])
+        self.service_totals = dict(data['service_totals'])
+        self.precool_set = set(data['precool'])
+
+        self.power.reset()
+        for rid in self.service_queue:
+            self.power.admit(rid, rooms[rid].fan_speed)
+        for rid in self.precool_set:
+            self.power.admit(rid, 'LOW')
+        self.power.energy_kwh = data['energy_kwh']
+
+        self.simulation_start_time = now - timedelta(seconds=data['sim_elapsed'])
+        self.last_tick_time = now
+        self.state_version += 1
@@ -0,0 +1,132 @@
+"""
+房间/详单的轻量序列化：
+- 房间状态直接取自调度器运行时，每个状态版本 (物理 tick 或控制操作) 只计算一次，
+  同一版本内的重复轮询直接返回已编码好的响应体；
+- ?fields=a,b,c 投影只输出需要的字段；
+- format=columnar 以 {字段: [值...]} 的列式结构返回批量数据，省去每行重复的键名。
+"""
+from flask import Response
+import json
+import threading
+
+ROOM_FIELDS = ('room_id', 'current_temp', 'target_temp', 'fan_speed', 'power_status', 'fee_rate',
+               'current_fee', 'total_fee', 'customer_id', 'status', 'sched_status')
+
+RECORD_FIELDS = ('record_id', 'room_id', 'session_id', 'start_time', 'end_time', 'duration',
+                 'fan_speed', 'fee_rate', 'fee')
+
+FORMATS = ('rows', 'columnar')
+
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+
+def parse_fields(arg, allowed):
+    """解析 ?fields=，返回字段元组；未知字段抛出 ValueError"""
+    if not arg: return tuple(allowed)
+    fields = tuple(f.strip() for f in arg.split(',') if f.strip())
+    unknown = [f for f in fields if f not in allowed]
+    if unknown or not fields:
+        raise ValueError(f"Unknown fields: {','.join(unknown)}")
+    return fields
+
+
+def parse_format(arg):
+    fmt = (arg or 'rows').strip().lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    return fmt
+
+
+def shape(rows, all_fields, fields, fmt):
+    """rows 为与 all_fields 对齐的元组列表，按投影和格式生成可 JSON 编码的数据"""
+    if fields == tuple(all_fields):
+        idx = None
+    else:
+        pos = {f: i for i, f in enumerate(all_fields)}
+        idx = [pos[f] for f in fields]
+
+    if fmt == 'columnar':
+        if idx is None:
+            columns = list(zip(*rows)) if rows else [()] * len(fields)
+        else:
+            columns = [[row[i] for row in rows] for i in idx]
+        return {f: list(col) for f, col in zip(fields, columns)}
+
+    if idx is None:
+        return [dict(zip(fields, row)) for row in rows]
+    return [{f: row[i] for f, i in zip(fields, idx)} for row in rows]
+
+
+def json_response(payload):
+    return Response(payload if isinstance(payload, bytes) else _dumps(payload),
+                    mimetype='application/json')
+
+
+def record_row(r):
+    """DetailRecord -> 与 RECORD_FIELDS 对齐的元组"""
+    return (r.record_id, r.room_id, r.session_id,
+            r.start_time.isoformat() if r.start_time else None,
+            r.end_time.isoformat() if r.end_time else None,
+            r.duration,
+            r.fan_speed,
+            float(r.fee_rate) if r.fee_rate is not None else 0.0,
+            float(r.fee) if r.fee is not None else 0.0)
+
+
+class RoomPayloadCache:
+    """
+    按调度器 state_version 缓存房间行和编码后的响应体。
+    版本不变时不再访问数据库或重新编码；版本变化后第一次请求时重建。
+    (version, rows, index, encoded) 作为一个元组整体替换，读取方无需加锁。
+    """
+    MAX_ENCODED = 32
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = (None, [], {}, {})
+
+    @property
+    def version(self):
+        return self._state[0]
+
+    def _current(self, scheduler):
+        version = scheduler.state_version
+        state = self._state
+        if state[0] == version: return state
+        with self._lock:
+            state = self._state
+            if state[0] == version: return state
+            status = scheduler.get_scheduling_status
+            rows = []
+            for rid in list(scheduler.room_order):
+                rt = scheduler.rooms.get(rid)
+                if rt is None: continue
+                rows.append((rt.room_id, round(rt.current_temp, 4), round(rt.target_temp, 4),
+                             rt.fan_speed, rt.power_status, round(rt.fee_rate, 4),
+                             round(rt.current_fee, 4), round(rt.total_fee, 4),
+                             rt.customer_id, rt.status, status(rid)))
+            state = (version, rows, {row[0]: row for row in rows}, {})
+            self._state = state
+            return state
+
+    def room(self, scheduler, room_id, fields=ROOM_FIELDS):
+        row = self._current(scheduler)[2].get(room_id)
+        if row is None: return None
+        return shape([row], ROOM_FIELDS, fields, 'rows')[0]
+
+    def encoded_rooms(self, scheduler, fields=ROOM_FIELDS, fmt='rows', room_ids=None):
+        """批量房间状态的完整响应体 (bytes)；未指定 room_ids 的请求按版本缓存"""
+        version, rows, index, encoded = self._current(scheduler)
+        if room_ids is not None:
+            rows = [index[rid] for rid in room_ids if rid in index]
+            return _dumps({'code': 200, 'version': version,
+                           'data': shape(rows, ROOM_FIELDS, fields, fmt)}).encode('utf-8')
+
+        key = (fields, fmt)
+        body = encoded.get(key)
+        if body is None:
+            body = _dumps({'code': 200, 'version': version,
+                           'data': shape(rows, ROOM_FIELDS, fields, fmt)}).encode('utf-8')
+            if len(encoded) >= self.MAX_ENCODED: encoded.clear()
+            encoded[key] = body
+        return body
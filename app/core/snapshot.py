@@ -0,0 +1,68 @@
+"""
+系统快照的文件格式：gzip 压缩的 JSON，房间按列名 + 行数组紧凑存放。
+快照只记录 detail_record 的高水位 (record_mark) 和拍摄时刻，恢复时只回滚之后新增的行：
+语句数固定 (分组撤销汇总、批量删除、批量写回房间)，不加载详单对象，
+耗时与快照之前的历史无关，只随快照之后新增的行数增长。
+"""
+from app.models import Room
+from config import SystemConstants
+from sqlalchemy import bindparam
+import gzip
+import json
+import os
+import re
+
+ROOM_FIELDS = ['room_id', 'current_temp', 'target_temp', 'fan_speed', 'power_status', 'fee_rate',
+               'current_fee', 'total_fee', 'active_session_id', 'customer_id', 'status']
+
+_NAME_RE = re.compile(r'^[A-Za-z0-9_\-]{1,64}$')
+
+_room = Room.__table__
+
+ROOM_RESTORE = _room.update() \
+    .where(_room.c.room_id == bindparam('b_room_id')) \
+    .values(**{f: bindparam('b_' + f) for f in ROOM_FIELDS if f != 'room_id'})
+
+
+def valid_name(name):
+    return bool(name) and bool(_NAME_RE.match(str(name)))
+
+
+def snapshot_path(name):
+    if not valid_name(name):
+        raise ValueError(f"Invalid snapshot name: {name}")
+    return os.path.join(SystemConstants.SNAPSHOT_DIR, f"{name}.json.gz")
+
+
+def exists(name):
+    return valid_name(name) and os.path.exists(snapshot_path(name))
+
+
+def save(name, data):
+    os.makedirs(SystemConstants.SNAPSHOT_DIR, exist_ok=True)
+    path = snapshot_path(name)
+    tmp = path + '.tmp'
+    with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp, path)
+    return path
+
+
+def load(name):
+    if not exists(name): return None
+    with gzip.open(snapshot_path(name), 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def list_snapshots():
+    if not os.path.isdir(SystemConstants.SNAPSHOT_DIR): return []
+    result = []
+    for fn in sorted(os.listdir(SystemConstants.SNAPSHOT_DIR)):
+        if not fn.endswith('.json.gz'): continue
+        path = os.path.join(SystemConstants.SNAPSHOT_DIR, fn)
+        result.append({'name': fn[:-len('.json.gz')], 'size': os.path.getsize(path)})
+    return result
+
+
+def room_restore_params(rows):
+    return [{'b_' + f: v for f, v in zip(ROOM_FIELDS, row)} for row in rows]
@@ -0,0 +1,322 @@
+"""
+长时间压测 (soak)：把场景脚本按时间回放到调度器和 HTTP 接口 (Flask test client)，
+定期采样并报告：
+- 进程内存 (RSS) 增长，按每系统小时的斜率给出；
+- 物理 tick 耗时 (计算 + 持久化) 的 p50/p99 及首尾漂移；
+- detail_record 行数增长；
+- 连接池占用峰值，达到 pool_size + max_overflow 视为耗尽；
+- 接口错误数与接口耗时 p99。
+
+默认使用临时 sqlite 文件和临时快照目录；--db 可指向独立的 MySQL 测试库 (会建表并写入场景房间)。
+--kx 覆盖 TIME_KX 以加速：默认 60，即 1 真实秒 = 1 系统分钟，24 系统小时约 24 分钟。
+
+用法: python -m app.core.scenario_gen --rooms 2000 --out /tmp/gen.csv
+      python -m app.core.soak /tmp/gen.csv --kx 60 --hours 6 --clients 4
+"""
+from app.core.policy_harness import load_scenario
+from config import Config, SystemConstants
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import event
+import argparse
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+REPORT_COLUMNS = ['sys_hours', 'rss_mb', 'tick_p50_ms', 'tick_p99_ms', 'records',
+                  'pool_peak', 'errors', 'req_p99_ms', 'serving', 'waiting']
+
+
+def _rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1048576.0
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _pct(values, q):
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _slope(xs, ys):
+    """最小二乘斜率"""
+    n = len(xs)
+    if n < 2: return 0.0
+    mx, my = sum(xs) / n, sum(ys) / n
+    den = sum((x - mx) ** 2 for x in xs)
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / den if den else 0.0
+
+
+class PoolWatch:
+    """通过连接池事件统计当前/峰值借出连接数"""
+
+    def __init__(self, engine):
+        self.lock = threading.Lock()
+        self.out = 0
+        self.peak = 0
+        pool = engine.pool
+        size = getattr(pool, 'size', None)
+        overflow = getattr(pool, '_max_overflow', 0)
+        self.capacity = size() + max(overflow, 0) if callable(size) else None
+        event.listen(engine, 'checkout', self._checkout)
+        event.listen(engine, 'checkin', self._checkin)
+
+    def _checkout(self, *args):
+        with self.lock:
+            self.out += 1
+            self.peak = max(self.peak, self.out)
+
+    def _checkin(self, *args):
+        with self.lock:
+            self.out -= 1
+
+    def take_peak(self):
+        with self.lock:
+            peak, self.peak = self.peak, self.out
+        return peak
+
+
+class SoakRunner:
+
+    def __init__(self, app, db, events, mode='COOL', clients=4):
+        from app.core.scheduler import Scheduler
+        self.app = app
+        self.db = db
+        self.events = events
+        self.mode = mode
+        self.scheduler = Scheduler()
+        with app.app_context():
+            self.pool = PoolWatch(db.engine)
+        self.local = threading.local()
+        self.executors = [ThreadPoolExecutor(max_workers=1) for _ in range(max(1, clients))]
+        self.lock = threading.Lock()
+        self.errors = 0
+        self.requests = 0
+        self.latencies = []
+        self.samples = []
+
+    # ---------- 准备 ----------
+
+    def seed_rooms(self):
+        from app.models import Room
+        rooms = sorted({e['room'] for e in self.events})
+        with self.app.app_context():
+            existing = {rid for (rid,) in self.db.session.query(Room.room_id).all()}
+            self.db.session.add_all([Room(room_id=rid) for rid in rooms if rid not in existing])
+            self.db.session.commit()
+        return len(rooms)
+
+    def start(self):
+        c = self.app.test_client()
+        c.post('/api/ac/setMode', json={'mode': self.mode})
+        c.post('/api/ac/startSimulation')
+
+    # ---------- 回放 ----------
+
+    def _client(self):
+        if not hasattr(self.local, 'client'):
+            self.local.client = self.app.test_client()
+        return self.local.client
+
+    def _call(self, method, url, body):
+        started = time.perf_counter()
+        ok = False
+        try:
+            r = getattr(self._client(), method)(url, json=body)
+            ok = r.status_code < 500 and (r.get_json(silent=True) or {}).get('code', 200) < 500
+        except Exception as e:
+            print(f"Soak Request Err {url}: {e}", file=sys.stderr)
+        with self.lock:
+            self.requests += 1
+            self.latencies.append((time.perf_counter() - started) * 1000.0)
+            if not ok: self.errors += 1
+
+    def _dispatch(self, e):
+        rid, action = e['room'], e['action']
+        if action == 'ON':
+            body = {'power_status': 'ON'}
+            if e['temp'] is not None: body['target_temp'] = e['temp']
+            if e['fan']: body['fan_speed'] = e['fan']
+            self._call('post', f'/api/ac/togglePower/{rid}', body)
+        elif action == 'OFF':
+            self._call('post', f'/api/ac/togglePower/{rid}', {'power_status': 'OFF'})
+        elif action == 'TEMP':
+            self._call('post', f'/api/ac/setTemp/{rid}', {'target_temp': e['temp']})
+        elif action == 'FAN':
+            self._call('post', f'/api/ac/setFanSpeed/{rid}', {'fan_speed': e['fan']})
+        elif action == 'CHECKIN':
+            self._call('post', '/api/front/checkIn',
+                       {'room_id': rid, 'customer_id': f"SOAK{rid}T{e['time']}", 'id_number': '000000000000000000'})
+        elif action == 'CHECKOUT':
+            self._call('post', '/api/front/checkOut', {'room_id': rid})
+
+    def _submit(self, e):
+        # 同一房间的事件固定落在同一个单线程执行器上，保证顺序
+        self.executors[hash(e['room']) % len(self.executors)].submit(self._dispatch, e)
+
+    # ---------- 采样 ----------
+
+    def sample(self, sys_minutes):
+        from app.models import DetailRecord
+        s = self.scheduler
+        with self.app.app_context():
+            records = self.db.session.query(DetailRecord).count()
+        ticks = s.tick_count
+        new_ticks = ticks - (self.samples[-1]['ticks'] if self.samples else 0)
+        tick_ms = list(s.tick_ms)[-new_ticks:] if new_ticks > 0 else []
+        with self.lock:
+            latencies, self.latencies = self.latencies, []
+            errors, requests = self.errors, self.requests
+
+        row = {
+            'sys_hours': round(sys_minutes / 60.0, 3),
+            'rss_mb': round(_rss_mb(), 1),
+            'ticks': ticks,
+            'tick_p50_ms': round(_pct(tick_ms, 0.5), 2),
+            'tick_p99_ms': round(_pct(tick_ms, 0.99), 2),
+            'records': records,
+            'pool_peak': self.pool.take_peak(),
+            'requests': requests,
+            'errors': errors,
+            'req_p99_ms': round(_pct(latencies, 0.99), 2),
+            'serving': len(s.service_queue),
+            'waiting': len(s.wait_queue),
+        }
+        self.samples.append(row)
+        return row
+
+    def run(self, hours=None, sample_sec=10.0, report=print):
+        horizon = (self.events[-1]['time'] + 1) if self.events else 0
+        if hours: horizon = min(horizon, hours * 60.0)
+        real_per_min = 60.0 / SystemConstants.TIME_KX
+
+        started = time.time()
+        next_sample = started
+        idx = 0
+        report(' '.join(f"{k:>12}" for k in REPORT_COLUMNS))
+        while True:
+            now = time.time()
+            sys_minutes = (now - started) / real_per_min
+            while idx < len(self.events) and self.events[idx]['time'] <= sys_minutes:
+                if self.events[idx]['time'] < horizon: self._submit(self.events[idx])
+                idx += 1
+            if now >= next_sample:
+                row = self.sample(sys_minutes)
+                report(' '.join(f"{row[k]:>12}" for k in REPORT_COLUMNS))
+                next_sample = now + sample_sec
+            if sys_minutes >= horizon: break
+            next_event = started + self.events[idx]['time'] * real_per_min if idx < len(self.events) else next_sample
+            time.sleep(max(0.0, min(next_event, next_sample, started + horizon * real_per_min) - time.time()))
+
+        for ex in self.executors:
+            ex.shutdown(wait=True)
+        self.sample((time.time() - started) / real_per_min)
+        return self.summary()
+
+    def summary(self):
+        rows = self.samples
+        if len(rows) < 2: return {}
+        # 去掉开头 10% 的预热样本后计算内存斜率
+        steady = rows[max(1, len(rows) // 10):]
+        window = max(1, len(rows) // 5)
+        head = [r['tick_p99_ms'] for r in rows[1:1 + window]]
+        tail = [r['tick_p99_ms'] for r in rows[-window:]]
+        hours = rows[-1]['sys_hours'] - rows[0]['sys_hours']
+        return {
+            'sys_hours': rows[-1]['sys_hours'],
+            'rss_start_mb': rows[0]['rss_mb'],
+            'rss_end_mb': rows[-1]['rss_mb'],
+            'rss_growth_mb_per_hour': round(_slope([r['sys_hours'] for r in steady],
+                                                   [r['rss_mb'] for r in steady]), 3),
+            'tick_p99_head_ms': round(_pct(head, 0.5), 2),
+            'tick_p99_tail_ms': round(_pct(tail, 0.5), 2),
+            'records': rows[-1]['records'],
+            'records_per_hour': round((rows[-1]['records'] - rows[0]['records']) / hours, 1) if hours else 0.0,
+            'pool_peak': max(r['pool_peak'] for r in rows),
+            'pool_capacity': self.pool.capacity,
+            'requests': rows[-1]['requests'],
+            'errors': rows[-1]['errors'],
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a scenario against the scheduler and API and track resource drift')
+    parser.add_argument('scenario')
+    parser.add_argument('--mode', default='COOL', choices=['COOL', 'HEAT'])
+    parser.add_argument('--kx', type=float, default=60.0, help='override TIME_KX (system seconds per real second)')
+    parser.add_argument('--hours', type=float, default=None, help='stop after N system hours')
+    parser.add_argument('--clients', type=int, default=4, help='concurrent API clients')
+    parser.add_argument('--sample-sec', type=float, default=10.0, help='real seconds between samples')
+    parser.add_argument('--db', default=None, help='SQLAlchemy URI (default: temporary sqlite file)')
+    parser.add_argument('--csv', default=None, help='write samples to this CSV file')
+    parser.add_argument('--max-rss-growth', type=float, default=None, help='fail above this MB per system hour')
+    parser.add_argument('--max-tick-drift', type=float, default=None, help='fail if tail/head tick p99 exceeds this ratio')
+    args = parser.parse_args(argv)
+
+    events = load_scenario(args.scenario)
+    SystemConstants.TIME_KX = args.kx
+    snapshot_dir = tempfile.mkdtemp(prefix='soak-snapshots-')
+    SystemConstants.SNAPSHOT_DIR = snapshot_dir
+
+    tmp = None
+    uri = args.db
+    if not uri:
+        tmp = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        tmp.close()
+        uri = f"sqlite:///{tmp.name}"
+    Config.SQLALCHEMY_DATABASE_URI = uri
+    if uri.startswith('sqlite'):
+        Config.SQLALCHEMY_ENGINE_OPTIONS = {}
+
+    from app import create_app, db
+    app = create_app()
+    db.app = app
+    try:
+        with app.app_context():
+            db.create_all()
+        runner = SoakRunner(app, db, events, args.mode, args.clients)
+        print(f">>> [Soak] {len(events)} events, {runner.seed_rooms()} rooms, TIME_KX={args.kx}")
+        runner.start()
+        result = runner.run(args.hours, args.sample_sec)
+        runner.scheduler.is_running = False
+        # 等待物理线程结束当前 tick，再清理临时库
+        time.sleep(1.0)
+
+        if args.csv and runner.samples:
+            with open(args.csv, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=list(runner.samples[0]))
+                writer.writeheader()
+                writer.writerows(runner.samples)
+
+        print(">>> [Soak] Summary")
+        for k, v in result.items():
+            print(f"{k:>24}: {v}")
+
+        failed = []
+        if result.get('errors'): failed.append('request errors')
+        if result.get('pool_capacity') and result['pool_peak'] >= result['pool_capacity']:
+            failed.append('connection pool exhausted')
+        if args.max_rss_growth is not None and result.get('rss_growth_mb_per_hour', 0) > args.max_rss_growth:
+            failed.append('memory growth')
+        if args.max_tick_drift is not None and result.get('tick_p99_head_ms') and \
+                result['tick_p99_tail_ms'] / result['tick_p99_head_ms'] > args.max_tick_drift:
+            failed.append('tick latency drift')
+        if failed:
+            print(f">>> [Soak] FAILED: {', '.join(failed)}")
+            return 1
+        return 0
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+        if tmp:
+            os.remove(tmp.name)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -58,19 +58,21 @@ class Room(db.Model):
             'status': self.status
         }
 
-    def check_in(self, customer_id):
+    def check_in(self, customer_id, commit=True):
         self.customer_id = customer_id
         self.status = 'OCCUPIED'
-        db.session.commit()
+        if commit: db.session.commit()
         return self
 
-    def check_out(self):
+    def check_out(self, commit=True):
         self.customer_id = None
         self.status = 'AVAILABLE'
         self.power_status = 'OFF'
         self.current_fee = 0.00
+        # 累计费用只属于本次入住，下一位住客从 0 开始
+        self.total_fee = 0.00
         self.active_session_id = None
-        db.session.commit()
+        if commit: db.session.commit()
         return self
 
 
@@ -129,4 +131,79 @@ class Invoice(db.Model):
             'ac_fee': float(self.ac_fee) if self.ac_fee else None,
             'total_amount': float(self.total_amount) if self.total_amount else None,
             'create_time': self.create_time.isoformat() if self.create_time else None
-        }
\ No newline at end of file
+        }
+
+class DemandProfile(db.Model):
+    """按 房间 x 小时 聚合的历史送风需求 (由 ForecastService 增量维护)"""
+    __tablename__ = 'demand_profile'
+
+    room_id = db.Column(db.String(10), primary_key=True)
+    hour = db.Column(db.Integer, primary_key=True)
+    service_seconds = db.Column(db.Float, default=0.0)
+    request_count = db.Column(db.Integer, default=0)
+    day_count = db.Column(db.Integer, default=0)
+    last_date = db.Column(db.Date)
+
+    def avg_demand(self, days):
+        """
+        该小时平均每天的送风时长 (系统秒)。days 为历史覆盖的总天数 (见 JobWatermark.span_days)，
+        没有需求的日子也计入分母，否则偶尔使用的房间会被高估。
+        """
+        return (self.service_seconds or 0.0) / days if days else 0.0
+
+    def to_dict(self, days):
+        return {
+            'room_id': self.room_id,
+            'hour': self.hour,
+            'service_seconds': self.service_seconds,
+            'request_count': self.request_count,
+            'day_count': self.day_count,
+            'avg_demand': self.avg_demand(days)
+        }
+
+
+class JobWatermark(db.Model):
+    """离线聚合任务的处理进度 (已处理到的 detail_record.record_id)"""
+    __tablename__ = 'job_watermark'
+
+    job_name = db.Column(db.String(32), primary_key=True)
+    last_record_id = db.Column(db.Integer, default=0)
+    # 已处理记录覆盖的日期范围 (需求画像按总天数求平均)
+    first_date = db.Column(db.Date)
+    last_date = db.Column(db.Date)
+    update_time = db.Column(db.DateTime, default=datetime.now)
+
+    def span_days(self):
+        if not self.first_date or not self.last_date: return 0
+        return (self.last_date - self.first_date).days + 1
+
+
+class UsageRollup(db.Model):
+    """房间 x 日 x 风速 的详单汇总，详单结束时由 ReportService 增量累加"""
+    __tablename__ = 'usage_rollup'
+
+    room_id = db.Column(db.String(10), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    fan_speed = db.Column(db.String(10), primary_key=True)
+    dispatch_count = db.Column(db.Integer, default=0)
+    service_seconds = db.Column(db.Float, default=0.0)
+    fee = db.Column(db.Numeric(12, 4), default=0.0000)
+
+    def to_dict(self):
+        return {
+            'room_id': self.room_id,
+            'day': self.day.isoformat() if self.day else None,
+            'fan_speed': self.fan_speed,
+            'dispatch_count': self.dispatch_count,
+            'service_seconds': self.service_seconds,
+            'fee': float(self.fee) if self.fee is not None else 0.0
+        }
+
+
+class SessionRollup(db.Model):
+    """房间每天出现过的开机会话，用于统计开关机次数 (distinct session_id)"""
+    __tablename__ = 'session_rollup'
+
+    room_id = db.Column(db.String(10), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    session_id = db.Column(db.String(36), primary_key=True)
@@ -0,0 +1,86 @@
+"""
+表结构检查 / 创建 (按需开启)：
+- OFF (默认)：启动时不访问数据库，表结构由 init.sql 负责；
+- VERIFY：检查模型对应的表和列是否存在，缺失时给出提示；
+- CREATE：缺失时执行 create_all。
+检查通过后把 (数据库地址, 模型结构签名) 写入 SCHEMA_CACHE，之后同一库同一版本的启动直接跳过。
+"""
+from config import SystemConstants
+from sqlalchemy import inspect
+import hashlib
+import json
+import os
+
+MODES = ('OFF', 'VERIFY', 'CREATE')
+
+
+def schema_signature(metadata):
+    parts = []
+    for table in sorted(metadata.tables.values(), key=lambda t: t.name):
+        parts.append(table.name + ':' + ','.join(sorted(c.name for c in table.columns)))
+    return hashlib.sha1(';'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _db_key(engine):
+    url = engine.url.render_as_string(hide_password=True)
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def _read_cache():
+    try:
+        with open(SystemConstants.SCHEMA_CACHE, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(cache):
+    path = SystemConstants.SCHEMA_CACHE
+    tmp = path + '.tmp'
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Schema Cache Err: {e}")
+
+
+def missing_objects(engine, metadata):
+    """返回缺失的表名和 表.列 列表"""
+    insp = inspect(engine)
+    existing = set(insp.get_table_names())
+    missing = []
+    for table in metadata.sorted_tables:
+        if table.name not in existing:
+            missing.append(table.name)
+            continue
+        cols = {c['name'] for c in insp.get_columns(table.name)}
+        missing.extend(f"{table.name}.{c.name}" for c in table.columns if c.name not in cols)
+    return missing
+
+
+def ensure_schema(db, mode=None):
+    """需要 app context。返回表结构是否可用 (OFF 模式视为可用)"""
+    mode = str(mode or SystemConstants.SCHEMA_MODE).strip().upper()
+    if mode not in MODES:
+        raise ValueError(f"Unknown schema mode: {mode}")
+    if mode == 'OFF': return True
+
+    from app import models  # noqa: F401  注册全部模型到 metadata
+
+    engine = db.engine
+    key, sig = _db_key(engine), schema_signature(db.metadata)
+    cache = _read_cache()
+    if cache.get(key) == sig: return True
+
+    missing = missing_objects(engine, db.metadata)
+    if missing and mode == 'CREATE':
+        db.create_all()
+        missing = missing_objects(engine, db.metadata)
+    if missing:
+        print(f">>> [Schema] Missing: {', '.join(missing)} (run init.sql or AC_SCHEMA=CREATE)")
+        return False
+
+    cache[key] = sig
+    _write_cache(cache)
+    return True
@@ -1,7 +1,7 @@
 from app import db
-from app.models import DetailRecord, Invoice, Room
+from app.models import Customer, DetailRecord, Invoice, Room
 from config import SystemConstants
-from sqlalchemy import func
+from sqlalchemy import func, or_
 from datetime import datetime
 import uuid
 
@@ -9,62 +9,100 @@ import uuid
 class BillService:
     @staticmethod
     def calculate_total_fee(room_id):
-        total_fee = db.session.query(func.sum(DetailRecord.fee)) \
-            .filter(DetailRecord.room_id == room_id) \
-            .scalar()
-        return float(total_fee) if total_fee is not None else 0.0
+        """本次入住的空调费用 (口径见 aggregate_usage)"""
+        return BillService.aggregate_usage([room_id]).get(room_id, (0.0, 0))[0]
 
     @staticmethod
     def calculate_stay_days(room_id):
         """
         计算入住天数：
-        逻辑：统计不重复的 session_id 数量。
+        逻辑：统计本次入住不重复的 session_id 数量。
         每个 session_id 对应一次完整的开机-关机周期。
         """
-        count = db.session.query(func.count(func.distinct(DetailRecord.session_id))) \
-            .filter(DetailRecord.room_id == room_id) \
-            .scalar()
+        count = BillService.aggregate_usage([room_id]).get(room_id, (0.0, 0))[1]
 
         # 如果 count 为 0 (比如只开了机没关机，或者刚开机)，至少算 1 天
         return count if count and count > 0 else 1
 
     @staticmethod
-    def create_invoice(room_id):
-        try:
-            room = Room.query.get(room_id)
-            if not room: return None
+    def aggregate_usage(room_ids):
+        """
+        一次分组查询得到多个房间本次入住的空调总费用与会话数：{room_id: (ac_fee, session_count)}
+        本次入住 = 该房间上一张账单退房之后、且不早于当前住客登记时间开始的详单 (需在退房前调用)。
+        """
+        last_invoice = db.session.query(Invoice.room_id,
+                                         func.max(Invoice.check_out_date).label('since')) \
+            .filter(Invoice.room_id.in_(room_ids)) \
+            .group_by(Invoice.room_id) \
+            .subquery()
+        rows = db.session.query(DetailRecord.room_id,
+                                func.sum(DetailRecord.fee),
+                                func.count(func.distinct(DetailRecord.session_id))) \
+            .join(Room, Room.room_id == DetailRecord.room_id) \
+            .outerjoin(Customer, Customer.customer_id == Room.customer_id) \
+            .outerjoin(last_invoice, last_invoice.c.room_id == DetailRecord.room_id) \
+            .filter(DetailRecord.room_id.in_(room_ids),
+                    or_(last_invoice.c.since.is_(None), DetailRecord.start_time >= last_invoice.c.since),
+                    or_(Customer.registration_date.is_(None),
+                        DetailRecord.start_time >= Customer.registration_date)) \
+            .group_by(DetailRecord.room_id) \
+            .all()
+        return {rid: (float(fee) if fee is not None else 0.0, count or 0) for rid, fee, count in rows}
 
-            ac_fee = BillService.calculate_total_fee(room_id)
+    @staticmethod
+    def build_invoice(room, ac_fee, session_count, now=None, customer=None):
+        # 如果 count 为 0 (比如只开了机没关机，或者刚开机)，至少算 1 天
+        stay_days = session_count if session_count and session_count > 0 else 1
 
-            # 使用新逻辑计算天数
-            stay_days = BillService.calculate_stay_days(room_id)
+        rate_key = str(room.room_id)
+        daily_rate = SystemConstants.ROOM_DAILY_RATES.get(rate_key, 100.0)
+        accommodation_fee = stay_days * daily_rate
 
-            rate_key = str(room_id)
-            daily_rate = SystemConstants.ROOM_DAILY_RATES.get(rate_key, 100.0)
-            accommodation_fee = stay_days * daily_rate
+        total_amount = ac_fee + accommodation_fee
 
-            total_amount = ac_fee + accommodation_fee
+        check_out_date = now or datetime.now()
+        # customer 由调用方批量加载，避免逐个房间懒加载 customer_ref
+        check_in_date = customer.registration_date if customer else check_out_date
 
-            check_out_date = datetime.now()
-            check_in_date = room.customer_ref.registration_date if room.customer_ref else check_out_date
+        return Invoice(
+            invoice_id=uuid.uuid4().hex,
+            room_id=room.room_id,
+            customer_id=room.customer_id if room.customer_id else "UNKNOWN",
+            check_in_date=check_in_date,
+            check_out_date=check_out_date,
+            stay_days=stay_days,
+            # 与列精度一致，保证提交前后 to_dict() 结果相同
+            accommodation_fee=round(accommodation_fee, 2),
+            ac_fee=round(ac_fee, 4),
+            total_amount=round(total_amount, 2),
+            create_time=check_out_date
+        )
 
-            new_invoice = Invoice(
-                invoice_id=uuid.uuid4().hex,
-                room_id=room_id,
-                customer_id=room.customer_id if room.customer_id else "UNKNOWN",
-                check_in_date=check_in_date,
-                check_out_date=check_out_date,
-                stay_days=stay_days,
-                accommodation_fee=accommodation_fee,
-                ac_fee=ac_fee,
-                total_amount=total_amount,
-                create_time=datetime.now()
-            )
+    @staticmethod
+    def create_invoices(rooms, commit=True):
+        """
+        批量开票 (团队退房)：费用与天数用一次分组查询算出，住客用一次 IN 查询加载，
+        所有账单在同一事务中写入。rooms 为 Room 对象列表；commit=False 时由调用方提交。
+        """
+        if not rooms: return []
+        usage = BillService.aggregate_usage([r.room_id for r in rooms])
+        customer_ids = {r.customer_id for r in rooms if r.customer_id}
+        customers = {c.customer_id: c for c in Customer.query.filter(
+            Customer.customer_id.in_(customer_ids)).all()} if customer_ids else {}
+        now = datetime.now()
+        invoices = [BillService.build_invoice(r, *usage.get(r.room_id, (0.0, 0)), now=now,
+                                              customer=customers.get(r.customer_id)) for r in rooms]
+        db.session.add_all(invoices)
+        if commit: db.session.commit()
+        return invoices
 
-            db.session.add(new_invoice)
-            db.session.commit()
-            return new_invoice
+    @staticmethod
+    def create_invoice(room_id):
+        try:
+            room = Room.query.get(room_id)
+            if not room: return None
+            return BillService.create_invoices([room])[0]
         except Exception as e:
             db.session.rollback()
             print(f"Error creating invoice: {e}")
-            return None
\ No newline at end of file
+            return None
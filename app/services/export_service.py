@@ -0,0 +1,243 @@
+from app import db
+from app.models import DetailRecord, Invoice
+from config import SystemConstants
+from sqlalchemy import func, case
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+import csv
+import io
+import threading
+import uuid
+
+
+class ExportJob:
+    __slots__ = ('job_id', 'kind', 'room_id', 'key', 'future')
+
+    def __init__(self, kind, room_id, key, future):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.room_id = room_id
+        self.key = key
+        self.future = future
+
+    def status(self):
+        if not self.future.done(): return 'PENDING'
+        if self.future.exception() is not None: return 'FAILED'
+        return 'DONE'
+
+    def to_dict(self):
+        data = {'job_id': self.job_id, 'type': self.kind, 'room_id': self.room_id, 'status': self.status()}
+        if data['status'] == 'FAILED':
+            data['msg'] = str(self.future.exception())
+        return data
+
+
+class ExportService:
+    """
+    账单/详单导出：后台线程池渲染，结果按 (类型, 房间, 最新 invoice_id, 详单高水位) 做 LRU 缓存。
+    详单高水位为该房间详单的 (最大 record_id, 行数)，压缩合并也会改变它；
+    房间仍有未结束的详单时内容每个 tick 都在变，不缓存。
+    同一 key 正在渲染时复用同一个任务。
+    """
+    _lock = threading.Lock()
+    _executor = None
+    _cache = OrderedDict()      # key -> (body, filename)
+    _inflight = {}              # key -> Future
+    _jobs = OrderedDict()       # job_id -> ExportJob
+
+    KINDS = ('bill', 'detail')
+
+    # ================= 渲染 =================
+
+    @staticmethod
+    def render_bill(room_id, invoice_id):
+        invoice = db.session.get(Invoice, invoice_id) if invoice_id else None
+        if not invoice: return None
+
+        output = io.StringIO()
+        output.write('\ufeff')
+        writer = csv.writer(output)
+        writer.writerow(['房间号', '入住时间', '离开时间', '入住天数', '空调费', '住宿费', '总费用'])
+        writer.writerow([
+            invoice.room_id,
+            invoice.check_in_date.strftime('%Y-%m-%d %H:%M:%S'),
+            invoice.check_out_date.strftime('%Y-%m-%d %H:%M:%S'),
+            invoice.stay_days,
+            f"{invoice.ac_fee:.2f}", f"{invoice.accommodation_fee:.2f}", f"{invoice.total_amount:.2f}"
+        ])
+        return output.getvalue().encode('gbk', 'ignore'), f"bill_{room_id}.csv"
+
+    @staticmethod
+    def render_detail(room_id, sim_start):
+        records = db.session.query(DetailRecord.room_id, DetailRecord.start_time, DetailRecord.duration,
+                                   DetailRecord.fan_speed, DetailRecord.fee_rate, DetailRecord.fee) \
+            .filter(DetailRecord.room_id == room_id).order_by(DetailRecord.start_time).all()
+
+        output = io.StringIO()
+        output.write('\ufeff')
+        writer = csv.writer(output)
+        writer.writerow(['房间', '请求时刻(分)', '开始(分)', '结束(分)', '时长(s)', '风速', '费率', '费用', '累积'])
+
+        cumulative = 0.0
+        for r in records:
+            d_start = (r.start_time - sim_start).total_seconds()
+            sys_start = (d_start * SystemConstants.TIME_KX) / 60.0
+            if sys_start < 0: sys_start = 0.0  # Clamp negative
+
+            duration_sec = float(r.duration)
+            sys_end = sys_start + (duration_sec / 60.0)  # 强制自洽
+
+            fee = float(r.fee) if r.fee else 0.0
+            cumulative += fee
+
+            writer.writerow([
+                r.room_id, f"{sys_start:.2f}", f"{sys_start:.2f}", f"{sys_end:.2f}",
+                f"{duration_sec:.0f}", r.fan_speed, f"{float(r.fee_rate):.2f}", f"{fee:.2f}", f"{cumulative:.2f}"
+            ])
+        return output.getvalue().encode('gbk', 'ignore'), f"detail_{room_id}.csv"
+
+    # ================= 缓存 key =================
+
+    @staticmethod
+    def latest_invoice_id(room_id):
+        return db.session.query(Invoice.invoice_id).filter(Invoice.room_id == room_id) \
+            .order_by(Invoice.create_time.desc()).limit(1).scalar()
+
+    @staticmethod
+    def record_mark(room_id):
+        """(最大 record_id, 行数, 未结束行数)，一次聚合查询"""
+        max_id, count, open_count = db.session.query(
+            func.max(DetailRecord.record_id), func.count(DetailRecord.record_id),
+            func.sum(case((DetailRecord.end_time.is_(None), 1), else_=0))
+        ).filter(DetailRecord.room_id == room_id).one()
+        return max_id or 0, count or 0, int(open_count or 0)
+
+    @staticmethod
+    def cache_key(kind, room_id, sim_start=None):
+        """返回 (key, 是否可缓存)"""
+        invoice_id = ExportService.latest_invoice_id(room_id)
+        if kind == 'bill':
+            return ('bill', room_id, invoice_id), invoice_id is not None
+        max_id, count, open_count = ExportService.record_mark(room_id)
+        # 详单时刻相对仿真起点换算，起点变化时内容也会变
+        key = ('detail', room_id, invoice_id, max_id, count, sim_start.isoformat())
+        return key, open_count == 0
+
+    # ================= 任务 =================
+
+    @classmethod
+    def _pool(cls):
+        if cls._executor is None:
+            with cls._lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(max_workers=SystemConstants.EXPORT_WORKERS,
+                                                       thread_name_prefix='ac-export')
+        return cls._executor
+
+    @classmethod
+    def _render(cls, key, cacheable, kind, room_id, sim_start):
+        """在工作线程中渲染并写入缓存 (需要 app context)"""
+        if kind == 'bill':
+            result = cls.render_bill(room_id, key[2])
+        else:
+            result = cls.render_detail(room_id, sim_start)
+        if result is not None and cacheable:
+            with cls._lock:
+                cls._cache[key] = result
+                cls._cache.move_to_end(key)
+                while len(cls._cache) > SystemConstants.EXPORT_CACHE_SIZE:
+                    cls._cache.popitem(last=False)
+        return result
+
+    @classmethod
+    def _run(cls, key, cacheable, kind, room_id, sim_start):
+        try:
+            with db.app.app_context():
+                return cls._render(key, cacheable, kind, room_id, sim_start)
+        finally:
+            with cls._lock:
+                cls._inflight.pop(key, None)
+
+    @classmethod
+    def _prefetch(cls, room_ids, sim_start):
+        """预取任务：缓存 key 的查询和渲染都在工作线程中完成，已缓存或正在渲染的跳过"""
+        with db.app.app_context():
+            for room_id in room_ids:
+                for kind in cls.KINDS:
+                    try:
+                        key, cacheable = cls.cache_key(kind, room_id, sim_start)
+                        if not cacheable: continue
+                        with cls._lock:
+                            if key in cls._cache or key in cls._inflight: continue
+                            # 登记为进行中，期间同 key 的 submit 复用这个结果
+                            future = cls._inflight[key] = Future()
+                        try:
+                            future.set_result(cls._render(key, cacheable, kind, room_id, sim_start))
+                        except Exception as e:
+                            future.set_exception(e)
+                            raise
+                        finally:
+                            with cls._lock:
+                                cls._inflight.pop(key, None)
+                    except Exception as e:
+                        print(f"Export Prefetch Err R{room_id}: {e}")
+
+    @classmethod
+    def submit(cls, kind, room_id, sim_start=None):
+        """提交导出任务 (需要 app context)；命中缓存时返回的任务已完成"""
+        if kind not in cls.KINDS:
+            raise ValueError(f"Unknown export type: {kind}")
+        key, cacheable = cls.cache_key(kind, room_id, sim_start)
+        pool = cls._pool()
+
+        with cls._lock:
+            if key in cls._cache:
+                cls._cache.move_to_end(key)
+                future = _done(cls._cache[key])
+            elif key in cls._inflight:
+                future = cls._inflight[key]
+            else:
+                future = pool.submit(cls._run, key, cacheable, kind, room_id, sim_start)
+                cls._inflight[key] = future
+
+            job = ExportJob(kind, room_id, key, future)
+            cls._jobs[job.job_id] = job
+            while len(cls._jobs) > SystemConstants.EXPORT_JOB_LIMIT:
+                cls._jobs.popitem(last=False)
+        return job
+
+    @classmethod
+    def get_job(cls, job_id):
+        with cls._lock:
+            return cls._jobs.get(job_id)
+
+    @classmethod
+    def export(cls, kind, room_id, sim_start=None, timeout=None):
+        """
+        同步下载：提交任务并最多等待 EXPORT_WAIT_SEC，返回任务。
+        超时后任务仍为 PENDING，调用方返回任务号，不阻塞请求线程。
+        """
+        job = cls.submit(kind, room_id, sim_start)
+        wait([job.future], timeout if timeout is not None else SystemConstants.EXPORT_WAIT_SEC)
+        return job
+
+    @classmethod
+    def prefetch(cls, room_ids, sim_start):
+        """
+        退房后预先渲染账单与详单 (此后内容不再变化，下载时直接命中缓存)。
+        只向线程池提交一个任务，请求线程不访问数据库。
+        """
+        room_ids = list(room_ids)
+        if room_ids:
+            cls._pool().submit(cls._prefetch, room_ids, sim_start)
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._lock:
+            cls._cache.clear()
+
+
+def _done(result):
+    future = Future()
+    future.set_result(result)
+    return future
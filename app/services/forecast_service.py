@@ -0,0 +1,121 @@
+from app import db
+from app.models import DetailRecord, DemandProfile, JobWatermark
+from config import SystemConstants
+from sqlalchemy import func
+from datetime import datetime, timedelta
+import threading
+
+
+class ForecastService:
+    """
+    需求预测：把已结束的 detail_record 增量聚合为 房间 x 小时 的需求画像，
+    并在进程内缓存，供调度器的预冷模式读取。
+    """
+    JOB_NAME = 'demand_profile'
+    BATCH_SIZE = 5000
+
+    _cache = None
+    _cache_time = None
+    _cache_lock = threading.Lock()
+
+    @staticmethod
+    def refresh_profiles():
+        """
+        处理 watermark 之后、且早于第一条未结束详单的记录，保证每条记录只计入一次。
+        返回本次处理的记录数。
+        """
+        try:
+            mark = JobWatermark.query.get(ForecastService.JOB_NAME)
+            if not mark:
+                mark = JobWatermark(job_name=ForecastService.JOB_NAME, last_record_id=0)
+                db.session.add(mark)
+            last_id = mark.last_record_id or 0
+
+            first_open = db.session.query(func.min(DetailRecord.record_id)) \
+                .filter(DetailRecord.record_id > last_id, DetailRecord.end_time.is_(None)) \
+                .scalar()
+
+            query = DetailRecord.query.filter(DetailRecord.record_id > last_id,
+                                              DetailRecord.end_time.isnot(None))
+            if first_open is not None:
+                query = query.filter(DetailRecord.record_id < first_open)
+            records = query.order_by(DetailRecord.record_id).limit(ForecastService.BATCH_SIZE).all()
+            if not records:
+                db.session.commit()
+                return 0
+
+            profiles = {}
+            for p in DemandProfile.query.filter(
+                    DemandProfile.room_id.in_({r.room_id for r in records})).all():
+                profiles[(p.room_id, p.hour)] = p
+
+            for r in records:
+                key = (r.room_id, r.start_time.hour)
+                p = profiles.get(key)
+                if not p:
+                    p = DemandProfile(room_id=key[0], hour=key[1], service_seconds=0.0,
+                                      request_count=0, day_count=0)
+                    db.session.add(p)
+                    profiles[key] = p
+                p.service_seconds = (p.service_seconds or 0.0) + float(r.duration or 0.0)
+                p.request_count = (p.request_count or 0) + 1
+                day = r.start_time.date()
+                if p.last_date != day:
+                    p.day_count = (p.day_count or 0) + 1
+                    p.last_date = day
+
+            days = [r.start_time.date() for r in records]
+            if mark.first_date: days.append(mark.first_date)
+            if mark.last_date: days.append(mark.last_date)
+            mark.first_date, mark.last_date = min(days), max(days)
+            mark.last_record_id = records[-1].record_id
+            mark.update_time = datetime.now()
+            db.session.commit()
+            ForecastService.invalidate()
+            return len(records)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error refreshing demand profiles: {e}")
+            return 0
+
+    @staticmethod
+    def get_profiles(max_age_sec=None):
+        """返回 {hour: {room_id: 平均每天送风时长}}，缓存 max_age_sec 秒"""
+        if max_age_sec is None: max_age_sec = SystemConstants.PROFILE_CACHE_SEC
+        with ForecastService._cache_lock:
+            now = datetime.now()
+            if ForecastService._cache is not None and \
+                    now - ForecastService._cache_time < timedelta(seconds=max_age_sec):
+                return ForecastService._cache
+
+            mark = db.session.get(JobWatermark, ForecastService.JOB_NAME)
+            days = mark.span_days() if mark else 0
+            profiles = {}
+            for p in DemandProfile.query.all():
+                profiles.setdefault(p.hour, {})[p.room_id] = p.avg_demand(days)
+            ForecastService._cache = profiles
+            ForecastService._cache_time = now
+            return profiles
+
+    @staticmethod
+    def predicted_demand(at_time=None):
+        """预测 at_time 所在小时各房间的送风需求 {room_id: 秒}"""
+        at_time = at_time or datetime.now()
+        return ForecastService.get_profiles().get(at_time.hour, {})
+
+    @staticmethod
+    def invalidate():
+        with ForecastService._cache_lock:
+            ForecastService._cache = None
+
+
+if __name__ == '__main__':
+    from run import app
+
+    with app.app_context():
+        total = 0
+        while True:
+            n = ForecastService.refresh_profiles()
+            total += n
+            if n < ForecastService.BATCH_SIZE: break
+        print(f">>> [Forecast] {total} records aggregated into demand profiles.")
@@ -0,0 +1,214 @@
+from app import db
+from app.models import DetailRecord, UsageRollup, SessionRollup, JobWatermark
+from config import SystemConstants
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, exists, func, or_, select
+import sys
+
+_usage = UsageRollup.__table__
+_session = SessionRollup.__table__
+
+_ROLLUP_SUBTRACT = _usage.update() \
+    .where(_usage.c.room_id == bindparam('b_room_id'), _usage.c.day == bindparam('b_day'),
+           _usage.c.fan_speed == bindparam('b_fan_speed')) \
+    .values(dispatch_count=_usage.c.dispatch_count - bindparam('b_count'),
+            service_seconds=_usage.c.service_seconds - bindparam('b_seconds'),
+            fee=_usage.c.fee - bindparam('b_fee'))
+
+
+class ReportService:
+    """
+    经理报表：详单结束时增量累加到 usage_rollup / session_rollup，
+    报表接口只读汇总表，与 detail_record 的规模无关。
+    """
+    COMPACT_JOB = 'compact'
+    COMPACT_BATCH = 5000
+
+    @staticmethod
+    def add_to_rollup(record):
+        """把一条刚结束的详单累加到汇总表 (在调用方事务内，不提交)"""
+        day = record.start_time.date()
+        fan = str(record.fan_speed).strip().upper()
+
+        row = db.session.get(UsageRollup, (record.room_id, day, fan))
+        if not row:
+            row = UsageRollup(room_id=record.room_id, day=day, fan_speed=fan,
+                              dispatch_count=0, service_seconds=0.0, fee=0.0)
+            db.session.add(row)
+        row.dispatch_count = (row.dispatch_count or 0) + 1
+        row.service_seconds = (row.service_seconds or 0.0) + float(record.duration or 0.0)
+        row.fee = float(row.fee or 0.0) + float(record.fee or 0.0)
+
+        if record.session_id and \
+                not db.session.get(SessionRollup, (record.room_id, day, record.session_id)):
+            db.session.add(SessionRollup(room_id=record.room_id, day=day, session_id=record.session_id))
+
+    @staticmethod
+    def remove_from_rollup(condition):
+        """
+        撤销满足 condition 的已结束详单对 usage_rollup 的累加 (快照回滚时使用，在调用方事务内)。
+        一次分组查询 + 一条 executemany，不加载详单对象；需在这些详单被删除之前调用。
+        返回涉及的最早日期 (没有时为 None)，删除详单后交给 prune_session_rollup。
+        """
+        day = func.date(DetailRecord.start_time, type_=db.Date)
+        rows = db.session.query(DetailRecord.room_id, day, DetailRecord.fan_speed,
+                                func.count(DetailRecord.record_id), func.sum(DetailRecord.duration),
+                                func.sum(DetailRecord.fee)) \
+            .filter(condition, DetailRecord.end_time.isnot(None)) \
+            .group_by(DetailRecord.room_id, day, DetailRecord.fan_speed).all()
+        if not rows: return None
+
+        db.session.execute(_ROLLUP_SUBTRACT, [
+            {'b_room_id': rid, 'b_day': d, 'b_fan_speed': str(fan).strip().upper(),
+             'b_count': count, 'b_seconds': float(seconds or 0.0), 'b_fee': float(fee or 0.0)}
+            for rid, d, fan, count, seconds, fee in rows])
+        db.session.execute(_usage.delete().where(_usage.c.dispatch_count <= 0))
+        return min(r[1] for r in rows)
+
+    @staticmethod
+    def prune_session_rollup(since):
+        """删除 since 之后已没有任何已结束详单的 session_rollup 行 (一条 NOT EXISTS 删除)"""
+        record = DetailRecord.__table__
+        has_record = select(record.c.record_id).where(
+            record.c.room_id == _session.c.room_id, record.c.session_id == _session.c.session_id,
+            record.c.end_time.isnot(None), func.date(record.c.start_time) == _session.c.day)
+        db.session.execute(_session.delete().where(_session.c.day >= since, ~exists(has_record)))
+
+    @staticmethod
+    def build_report(start, end, room_id=None, period='day'):
+        """
+        按 日/周 汇总 [start, end] 内各房间的开关机次数、调度次数、各风速送风时长与费用
+        """
+        q = UsageRollup.query.filter(UsageRollup.day >= start, UsageRollup.day <= end)
+        sq = SessionRollup.query.filter(SessionRollup.day >= start, SessionRollup.day <= end)
+        if room_id:
+            q = q.filter(UsageRollup.room_id == room_id)
+            sq = sq.filter(SessionRollup.room_id == room_id)
+
+        def bucket(day):
+            if period == 'week': return day - timedelta(days=day.weekday())
+            return day
+
+        result = {}
+
+        def entry(rid, day):
+            key = (rid, bucket(day))
+            if key not in result:
+                result[key] = {
+                    'room_id': rid, 'period_start': key[1].isoformat(), 'on_off_count': 0,
+                    'dispatch_count': 0, 'service_seconds': 0.0, 'fee': 0.0, 'by_fan_speed': {},
+                    '_sessions': set()
+                }
+            return result[key]
+
+        for row in q.all():
+            e = entry(row.room_id, row.day)
+            fan = e['by_fan_speed'].setdefault(row.fan_speed, {'service_seconds': 0.0, 'fee': 0.0})
+            fee = float(row.fee or 0.0)
+            fan['service_seconds'] += row.service_seconds or 0.0
+            fan['fee'] += fee
+            e['dispatch_count'] += row.dispatch_count or 0
+            e['service_seconds'] += row.service_seconds or 0.0
+            e['fee'] += fee
+
+        for s in sq.all():
+            entry(s.room_id, s.day)['_sessions'].add(s.session_id)
+
+        report = []
+        for key in sorted(result):
+            e = result[key]
+            e['on_off_count'] = len(e.pop('_sessions'))
+            e['fee'] = round(e['fee'], 2)
+            report.append(e)
+        return report
+
+    @staticmethod
+    def rebuild_rollups():
+        """从原始详单重建汇总表 (首次上线或修复时使用；压缩后调度次数会偏少)"""
+        try:
+            UsageRollup.query.delete()
+            SessionRollup.query.delete()
+            for r in DetailRecord.query.filter(DetailRecord.end_time.isnot(None)) \
+                    .order_by(DetailRecord.record_id).yield_per(1000):
+                ReportService.add_to_rollup(r)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error rebuilding rollups: {e}")
+
+    @staticmethod
+    def compact_records(older_than_days=None):
+        """
+        合并同一房间、同一会话、同风速且首尾相接的已结束详单，费用与时长相加。
+        按 record_id 分批处理，进度记在 job_watermark (COMPACT_JOB)，每次只扫描上次之后的记录。
+        汇总表在详单结束时已计入，不受影响。返回合并掉的记录数。
+        """
+        if older_than_days is None: older_than_days = SystemConstants.COMPACT_AFTER_DAYS
+        cutoff = datetime.now() - timedelta(days=older_than_days)
+        gap = timedelta(seconds=SystemConstants.COMPACT_MAX_GAP_SEC)
+
+        merged = 0
+        try:
+            mark = db.session.get(JobWatermark, ReportService.COMPACT_JOB)
+            if not mark:
+                mark = JobWatermark(job_name=ReportService.COMPACT_JOB, last_record_id=0)
+                db.session.add(mark)
+            start_id = mark.last_record_id or 0
+
+            # 本次处理 (start_id, end_id]：区间内全部已结束且早于 cutoff，水位不会越过尚未满足条件的记录
+            end_id = db.session.query(func.max(DetailRecord.record_id)).scalar() or 0
+            # 不动需求预测任务尚未处理的记录，避免其时长被并入已处理记录而丢失
+            forecast = db.session.get(JobWatermark, 'demand_profile')
+            if forecast:
+                end_id = min(end_id, forecast.last_record_id or 0)
+            pending = db.session.query(func.min(DetailRecord.record_id)) \
+                .filter(DetailRecord.record_id > start_id,
+                        or_(DetailRecord.end_time.is_(None), DetailRecord.end_time >= cutoff)) \
+                .scalar()
+            if pending is not None:
+                end_id = min(end_id, pending - 1)
+
+            # 同一房间的详单依次开启，record_id 顺序即开始时间顺序；
+            # prev 为各房间最近一条保留的记录，首次遇到时取水位之前的最后一条，使跨批次、跨运行的相邻记录也能合并
+            prev = {}
+            last_id = start_id
+            while last_id < end_id:
+                batch = DetailRecord.query \
+                    .filter(DetailRecord.record_id > last_id, DetailRecord.record_id <= end_id) \
+                    .order_by(DetailRecord.record_id).limit(ReportService.COMPACT_BATCH).all()
+                if not batch: break
+                for r in batch:
+                    if r.room_id not in prev:
+                        prev[r.room_id] = DetailRecord.query \
+                            .filter(DetailRecord.room_id == r.room_id, DetailRecord.record_id <= start_id) \
+                            .order_by(DetailRecord.record_id.desc()).first() if start_id else None
+                    p = prev[r.room_id]
+                    if p is not None and p.session_id == r.session_id and p.fan_speed == r.fan_speed and \
+                            p.end_time is not None and r.start_time - p.end_time <= gap:
+                        p.end_time = r.end_time
+                        p.duration = float(p.duration or 0.0) + float(r.duration or 0.0)
+                        p.fee = float(p.fee or 0.0) + float(r.fee or 0.0)
+                        db.session.delete(r)
+                        merged += 1
+                        continue
+                    prev[r.room_id] = r
+                last_id = batch[-1].record_id
+                mark.last_record_id = last_id
+                mark.update_time = datetime.now()
+                db.session.commit()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error compacting records: {e}")
+        return merged
+
+if __name__ == '__main__':
+    from run import app
+
+    cmd = sys.argv[1] if len(sys.argv) > 1 else 'compact'
+    with app.app_context():
+        if cmd == 'rebuild':
+            ReportService.rebuild_rollups()
+            print(">>> [Report] Rollups rebuilt.")
+        else:
+            print(f">>> [Report] {ReportService.compact_records()} records merged.")
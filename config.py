@@ -30,6 +30,64 @@ class SystemConstants:
 
     RECOVER_RATE = 0.5
 
+    # === 调度策略 (可按部署通过环境变量切换) ===
+    # PRIORITY_RR: 优先级+抢占+时间片轮转 (默认)
+    # WFQ: 加权公平队列  SRDF: 最短剩余温差优先  ENERGY: 功率预算 (按 kW 而非台数限流)
+    SCHEDULING_POLICY = os.environ.get('AC_SCHEDULING_POLICY', 'PRIORITY_RR')
+
+    # === 中央机组功率模型 ===
+    # 各风速单台功率 (kW)，与 FEE_RATE_* / TEMP_XH_* 的 3 : 1.5 : 1 比例一致
+    FAN_POWER_KW = {
+        'HIGH': 3.0,
+        'MID': 1.5,
+        'LOW': 1.0
+    }
+    # ENERGY 策略下机组总功率上限 (kW)，默认按机组铭牌容量 MAX_SERVICE 台高风 (9 kW) 计：
+    # 全高风时与 PRIORITY_RR 同为 3 台，低/中风房间多时可同时服务更多台 (低风最多 9 台)。
+    # 调低该值是用吞吐换峰值功率：低于 MAX_SERVICE 台高风时，高风房间会被卡在等待队列，
+    # 达标吞吐反而低于按台数限流 (data/cool.csv 上 4.5 kW 时 ENERGY 为 0 间/小时)。
+    POWER_BUDGET_KW = float(os.environ.get('AC_POWER_BUDGET_KW', MAX_SERVICE * FAN_POWER_KW['HIGH']))
+
+    # tick 持久化方式: EXECUTEMANY (默认) / CASE (单条多行 UPDATE，适合 DB 往返延迟高的部署) / ORM
+    PERSIST_MODE = 'EXECUTEMANY'
+
+    # === 操作合并：已开机房间的连续调温/调风在窗口内合并为一次状态切换 (真实秒，0 为关闭) ===
+    CONTROL_COALESCE_SEC = 1.0
+    CONTROL_COALESCE_MAX_SEC = 3.0     # 连续操作时最长推迟时间
+    CONTROL_COALESCE_ROOMS = {}        # 按房间覆盖窗口，如 {'101': 0.0}
+
+    # === 预冷/预热模式：按历史需求画像，在空闲服务位提前调节即将用空调的在住房间 ===
+    PRECOOL_ENABLED = False
+    PRECOOL_LEAD_MINUTES = 30      # 提前量：查看 (现在 + 提前量) 所在小时的预测需求
+    PRECOOL_MIN_DEMAND = 60.0      # 平均每天送风时长 (系统秒) 超过该值才预冷
+    PROFILE_CACHE_SEC = 300        # 需求画像在进程内的缓存时间
+
+    # === 详单压缩：合并超过 N 天、同会话同风速且间隔不超过 GAP 秒的相邻详单 ===
+    COMPACT_AFTER_DAYS = 1
+    COMPACT_MAX_GAP_SEC = 1.0
+
+    # === 系统快照目录 (setMode wipe=true 的基线快照也保存在这里) ===
+    SNAPSHOT_DIR = os.environ.get('AC_SNAPSHOT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshots'))
+
+    # === 账单/详单导出：后台线程数、LRU 缓存条数、保留的任务数、同步下载最长等待 (秒) ===
+    # 超过等待时间的下载返回 202 和任务号，由 /api/front/exports/<job_id>/download 取结果
+    EXPORT_WORKERS = 2
+    EXPORT_CACHE_SIZE = 256
+    EXPORT_JOB_LIMIT = 1024
+    EXPORT_WAIT_SEC = 1
+
+    # === 启动 ===
+    # 表结构检查: OFF (默认，不访问数据库) / VERIFY / CREATE，通过后按库缓存到 SCHEMA_CACHE
+    SCHEMA_MODE = os.environ.get('AC_SCHEMA', 'OFF')
+    SCHEMA_CACHE = os.environ.get('AC_SCHEMA_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.schema_cache.json'))
+    # 冷启动 (进程启动到第一个请求返回) 预算，python -m app.core.cold_start 检查
+    COLD_START_BUDGET_MS = 1500
+
+    # === 管理接口 (/api/admin)：请求头 X-Admin-Token 需与之一致，未设置时管理接口关闭 ===
+    ADMIN_TOKEN = os.environ.get('AC_ADMIN_TOKEN')
+    PROFILER_INTERVAL_MS = 5       # 采样间隔
+    PROFILER_MAX_SECONDS = 60      # 单次采样最长时间
+
     # === 新增：房间日租金配置 ===
     ROOM_DAILY_RATES = {
         '101': 100.0,
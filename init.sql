@@ -70,4 +70,47 @@ CREATE TABLE `invoice` (
     `total_amount` DECIMAL(12,2) DEFAULT 0.00,
     `create_time` DATETIME DEFAULT CURRENT_TIMESTAMP,
     PRIMARY KEY (`invoice_id`)
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
\ No newline at end of file
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+-- 5. 需求画像表 (房间 x 小时)，由 ForecastService 增量维护
+DROP TABLE IF EXISTS `demand_profile`;
+CREATE TABLE `demand_profile` (
+    `room_id` VARCHAR(10) NOT NULL,
+    `hour` INT NOT NULL COMMENT '0-23',
+    `service_seconds` DOUBLE DEFAULT 0 COMMENT '累计送风时长(系统秒)',
+    `request_count` INT DEFAULT 0 COMMENT '送风请求次数',
+    `day_count` INT DEFAULT 0 COMMENT '出现需求的天数 (平均值按历史覆盖的总天数计算)',
+    `last_date` DATE DEFAULT NULL,
+    PRIMARY KEY (`room_id`, `hour`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 6. 离线任务进度
+DROP TABLE IF EXISTS `job_watermark`;
+CREATE TABLE `job_watermark` (
+    `job_name` VARCHAR(32) NOT NULL,
+    `last_record_id` INT DEFAULT 0,
+    `first_date` DATE DEFAULT NULL COMMENT '已处理记录覆盖的首日',
+    `last_date` DATE DEFAULT NULL COMMENT '已处理记录覆盖的末日',
+    `update_time` DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`job_name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 7. 报表汇总表 (房间 x 日 x 风速)，详单结束时增量维护
+DROP TABLE IF EXISTS `usage_rollup`;
+CREATE TABLE `usage_rollup` (
+    `room_id` VARCHAR(10) NOT NULL,
+    `day` DATE NOT NULL,
+    `fan_speed` VARCHAR(10) NOT NULL,
+    `dispatch_count` INT DEFAULT 0 COMMENT '调度(送风)次数',
+    `service_seconds` DOUBLE DEFAULT 0 COMMENT '送风时长(系统秒)',
+    `fee` DECIMAL(12,4) DEFAULT 0.0000 COMMENT '费用',
+    PRIMARY KEY (`room_id`, `day`, `fan_speed`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 8. 开机会话汇总 (统计开关机次数)
+DROP TABLE IF EXISTS `session_rollup`;
+CREATE TABLE `session_rollup` (
+    `room_id` VARCHAR(10) NOT NULL,
+    `day` DATE NOT NULL,
+    `session_id` VARCHAR(36) NOT NULL,
+    PRIMARY KEY (`room_id`, `day`, `session_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -1,23 +1,39 @@
-from app import create_app, db
-from app import models  # 确保模型被加载
+_app = None
 
-app = create_app()
-# 绑定 app 到 db，供 Scheduler 线程使用
-db.app = app
 
-if __name__ == '__main__':
-    with app.app_context():
-        # 这将触发 init.sql 中定义的表结构创建（包含 DROP TABLE）
-        db.create_all()
+def get_app():
+    """首次访问时才构建 Flask 应用 (import run 本身不再加载 Flask / 模型 / 蓝图)"""
+    global _app
+    if _app is None:
+        from app import create_app, db
+        from app import models  # 确保模型被加载
+
+        _app = create_app()
+        # 绑定 app 到 db，供 Scheduler 线程使用
+        db.app = _app
+    return _app
+
 
-        # 启动调度器
-        from app.core.scheduler import Scheduler
+def __getattr__(name):
+    # 兼容 `from run import app` 与 WSGI 服务器的 run:app
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f"module 'run' has no attribute {name!r}")
 
-        scheduler = Scheduler()
+
+if __name__ == '__main__':
+    from app import db
+    from app.schema import ensure_schema
+
+    app = get_app()
+    with app.app_context():
+        # 表结构以 init.sql 为准；AC_SCHEMA=VERIFY 检查、AC_SCHEMA=CREATE 补建缺失的表，结果按库缓存
+        ensure_schema(db)
 
         print(">>> System Initialized.")
         print(">>> 1. Call POST /api/ac/setMode to reset.")
-        print(">>> 2. 10s Real Time = 1min System Time.")
+        print(">>> 2. Call POST /api/ac/startSimulation to start the physics engine.")
+        print(">>> 3. 10s Real Time = 1min System Time.")
 
     # use_reloader=False 防止线程启动两次
-    app.run(debug=True, port=5000, use_reloader=False)
\ No newline at end of file
+    app.run(debug=True, port=5000, use_reloader=False)